@@ -0,0 +1,236 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage, Page
+from django.http import Http404
+from django.shortcuts import redirect
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed, NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import exception_handler
+
+from foodgram_backend.replicas import use_primary
+from recipes.models import Recipe
+from .authentication import CachedTokenAuthentication, token_cache
+from .autocomplete import get_search_limit, ingredient_index
+from .conditional import finalize, make_etag
+from .registry import tag_registry
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+
+class AsyncTokenAuthentication(CachedTokenAuthentication):
+    """CachedTokenAuthentication для асинхронных view."""
+
+    def authenticate_credentials(self, key):
+        # Заголовок разбирает authenticate(), токен ищет aauthenticate().
+        return key
+
+    async def aauthenticate(self, request):
+        key = self.authenticate(request)
+        if key is None:
+            return None
+        caching = bool(settings.TOKEN_CACHE_SIZE)
+        version = None
+        if caching:
+            version = await token_cache.aversion(key)
+            credentials = token_cache.get(key, version)
+            if credentials is not None:
+                return credentials
+        try:
+            with use_primary():
+                token = await self.get_model().objects.select_related(
+                    'user'
+                ).aget(key=key)
+        except ObjectDoesNotExist:
+            raise AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        if caching:
+            token_cache.set(key, (token.user, token), version)
+        return token.user, token
+
+
+def async_read(viewset, actions):
+    """Асинхронный view для GET, остальные методы обрабатывает вьюсет.
+
+    Декорируемая корутина получает экземпляр вьюсета для действия
+    actions['get'] и аутентифицированный запрос DRF, прошедший
+    проверку permission_classes вьюсета, и возвращает Response. Ответ
+    всегда в JSON; ошибки оформляются так же, как во вьюсете.
+    """
+    sync_view = viewset.as_view(actions)
+
+    def decorator(read):
+        @wraps(read)
+        async def view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await sync_to_async(sync_view)(
+                    request, *args, **kwargs
+                )
+            drf_request = Request(request)
+            handler = viewset(
+                request=drf_request, args=args, kwargs=kwargs,
+                format_kwarg=None, action=actions['get'], headers={}
+            )
+            try:
+                drf_request.user, drf_request.auth = (
+                    await AsyncTokenAuthentication().aauthenticate(
+                        drf_request
+                    ) or (AnonymousUser(), None)
+                )
+                await sync_to_async(handler.check_permissions)(drf_request)
+                response = await read(handler, drf_request, *args, **kwargs)
+            except Exception as exc:
+                response = exception_handler(
+                    exc, handler.get_exception_handler_context()
+                )
+                if response is None:
+                    raise
+                if isinstance(exc, AuthenticationFailed):
+                    response['WWW-Authenticate'] = 'Token'
+            if isinstance(response, Response):
+                response.accepted_renderer = JSONRenderer()
+                response.accepted_media_type = JSONRenderer.media_type
+                response.renderer_context = handler.get_renderer_context()
+                response.render()
+            patch_vary_headers(response, ('Accept',))
+            return response
+
+        view.csrf_exempt = True
+        return view
+    return decorator
+
+
+async def paginate(view, queryset):
+    """Страница ленты; номер страницы считается асинхронным ORM.
+
+    Повторяет PageNumberPagination.paginate_queryset, курсорная
+    пагинация выполняется синхронно в потоке.
+    """
+    pagination = view.paginator
+    if not isinstance(pagination, PageNumberPagination):
+        return await sync_to_async(view.paginate_queryset)(queryset)
+    request = view.request
+    paginator = pagination.django_paginator_class(
+        queryset, pagination.get_page_size(request)
+    )
+    paginator.count = await queryset.acount()
+    page_number = pagination.get_page_number(request, paginator)
+    try:
+        number = paginator.validate_number(page_number)
+    except InvalidPage as exc:
+        raise NotFound(pagination.invalid_page_message.format(
+            page_number=page_number, message=str(exc)
+        ))
+    bottom = (number - 1) * paginator.per_page
+    objects = [
+        recipe async for recipe in queryset[
+            bottom:bottom + paginator.per_page
+        ]
+    ]
+    pagination.page = Page(objects, number, paginator)
+    pagination.request = request
+    return objects
+
+
+@async_read(RecipeViewSet, {'get': 'list', 'post': 'create'})
+async def recipe_list(view, request):
+    """Лента рецептов, как RecipeViewSet.list."""
+    # Версия ленты и фильтры обращаются к БД, поэтому в потоке.
+    etag, _ = await sync_to_async(RecipeViewSet.list.validators)(
+        view, request
+    )
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        queryset = await sync_to_async(view.filter_queryset)(
+            view.get_queryset()
+        )
+        page = await paginate(view, queryset)
+        data = await sync_to_async(
+            lambda: view.get_serializer(page, many=True).data
+        )()
+        response = view.get_paginated_response(data)
+    return finalize(response, etag, None, per_user=True)
+
+
+@async_read(RecipeViewSet, {
+    'get': 'retrieve', 'put': 'update',
+    'patch': 'partial_update', 'delete': 'destroy',
+})
+async def recipe_detail(view, request, pk):
+    """Рецепт, как RecipeViewSet.retrieve."""
+    etag, last_modified = await sync_to_async(
+        RecipeViewSet.retrieve.validators
+    )(view, request, pk=pk)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        queryset = await sync_to_async(view.filter_queryset)(
+            view.get_queryset()
+        )
+        try:
+            recipe = await queryset.aget(pk=pk)
+        except Recipe.DoesNotExist:
+            raise Http404('No Recipe matches the given query.')
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        await sync_to_async(view.check_object_permissions)(request, recipe)
+        data = await sync_to_async(lambda: view.get_serializer(recipe).data)()
+        response = Response(data)
+    return finalize(response, etag, last_modified, per_user=True)
+
+
+@async_read(TagViewSet, {'get': 'list'})
+async def tag_list(view, request):
+    tags, _, _ = await tag_registry.aget_data()
+    etag = make_etag(tag_registry.digest)
+    response = get_conditional_response(request, etag=etag)
+    return finalize(response or Response(tags), etag, None, per_user=False)
+
+
+@async_read(TagViewSet, {'get': 'retrieve'})
+async def tag_detail(view, request, pk):
+    _, tags_by_id, _ = await tag_registry.aget_data()
+    etag = make_etag(tag_registry.digest)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            tag = tags_by_id.get(int(pk))
+        except ValueError:
+            raise Http404
+        if tag is None:
+            raise Http404('No Tag matches the given query.')
+        response = Response(tag)
+    return finalize(response, etag, None, per_user=False)
+
+
+@async_read(IngredientViewSet, {'get': 'list'})
+async def ingredient_list(view, request):
+    data = await ingredient_index.aget_data()
+    etag = make_etag(ingredient_index.digest)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = Response(ingredient_index.search_data(
+            data, request.query_params.get('name', ''),
+            get_search_limit(request)
+        ))
+    return finalize(response, etag, None, per_user=False)
+
+
+async def recipe_redirection(request, short_link):
+    recipe_id = await Recipe.objects.filter(
+        short_link=short_link
+    ).values_list('id', flat=True).afirst()
+    if recipe_id is None:
+        raise Http404('No Recipe matches the given query.')
+    return redirect(
+        request.build_absolute_uri('/') + f'recipes/{recipe_id}/'
+    )
@@ -0,0 +1,127 @@
+import copy
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram_backend.replicas import use_primary
+
+
+class TokenCache:
+    """Пользователи по ключу токена в памяти процесса (LRU с TTL).
+
+    Хранит не больше TOKEN_CACHE_SIZE записей не дольше TOKEN_CACHE_TTL
+    секунд. У каждого токена есть версия в общем кеше Django: её меняет
+    invalidate() после выхода, удаления токена или изменения
+    пользователя, и записи со старой версией не используются. Поэтому
+    кеш включается только с общим кешем Django (REDIS_URL).
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def version_key(key):
+        return f'token-version-{key}'
+
+    def version(self, key):
+        """Текущая версия токена в общем кеше.
+
+        Если ключа версии нет (ещё не было или его вытеснили), ставится
+        новая версия, так что записи со старой или пустой версией
+        считаются отозванными.
+        """
+        return cache.get_or_set(self.version_key(key), time.time_ns, None)
+
+    async def aversion(self, key):
+        return await cache.aget_or_set(
+            self.version_key(key), time.time_ns, None
+        )
+
+    @staticmethod
+    def copy(credentials):
+        """Копии пользователя и токена: запросы их не разделяют."""
+        user, token = map(copy.copy, credentials)
+        token.user = user
+        return user, token
+
+    def get(self, key, version):
+        """Копии (user, token) или None, если записи нет или она устарела."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            credentials, entry_version, expires = entry
+            if entry_version != version or time.monotonic() > expires:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        return self.copy(credentials)
+
+    def set(self, key, credentials, version):
+        """Запоминает копии (user, token).
+
+        version должна быть прочитана до запроса к БД: тогда отзыв,
+        случившийся во время запроса, не пропадёт.
+        """
+        credentials = self.copy(credentials)
+        with self.lock:
+            self.entries[key] = (
+                credentials, version,
+                time.monotonic() + settings.TOKEN_CACHE_TTL
+            )
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def invalidate(self, keys):
+        """Отзывает записи токенов keys во всех процессах."""
+        version = time.time_ns()
+        cache.set_many(
+            {self.version_key(key): version for key in keys}, None
+        )
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, который запоминает пользователя токена.
+
+    Повторные запросы с тем же токеном обходятся без запроса к БД,
+    пока запись в token_cache не отозвана и не истекла. С
+    TOKEN_CACHE_SIZE=0 (нет общего кеша) токен всегда ищется в БД.
+    Изменяющие запросы тоже читают пользователя из БД: копия из кеша
+    может быть старой, и её сохранение вернуло бы старые значения.
+    """
+
+    use_cache = True
+
+    def authenticate(self, request):
+        self.use_cache = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        if not (settings.TOKEN_CACHE_SIZE and self.use_cache):
+            return super().authenticate_credentials(key)
+        version = token_cache.version(key)
+        credentials = token_cache.get(key, version)
+        if credentials is None:
+            # Запись живёт до TTL, поэтому пользователь читается не
+            # с реплики: там отзыв может ещё не появиться.
+            with use_primary():
+                credentials = super().authenticate_credentials(key)
+            token_cache.set(key, credentials, version)
+        return credentials
@@ -0,0 +1,92 @@
+from bisect import bisect_left, bisect_right
+from heapq import nsmallest
+
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import Ingredient
+from .registry import ProcessRegistry
+
+VERSION_CACHE_KEY = 'ingredient-index-version'
+
+
+def normalize(value):
+    """Приводит строку к виду для сравнения: регистр и ё/е не важны."""
+    return value.strip().casefold().replace('ё', 'е')
+
+
+def get_search_limit(request):
+    """Число подсказок из параметра limit, None - без поиска по name."""
+    if not request.query_params.get('name'):
+        return None
+    limit = settings.INGREDIENT_SEARCH_LIMIT
+    try:
+        limit = min(
+            int(request.query_params.get('limit', limit)),
+            settings.INGREDIENT_SEARCH_MAX_LIMIT
+        )
+    except ValueError:
+        raise ValidationError(
+            {'limit': 'Значение должно быть целым числом.'}
+        )
+    if limit < 1:
+        raise ValidationError({'limit': 'Значение должно быть больше 0.'})
+    return limit
+
+
+class IngredientIndex(ProcessRegistry):
+    """Индекс ингредиентов в памяти процесса для поиска по началу названия.
+
+    Строится одним запросом к БД и хранит отсортированный по
+    нормализованному названию список, поэтому поиск - это бинарный
+    поиск границ диапазона без обращения к БД. Индекс перестраивается,
+    если ингредиенты изменились: в этом процессе - сразу, в других -
+    по версии в общем кеше или по истечении INGREDIENT_INDEX_TTL.
+    """
+
+    version_cache_key = VERSION_CACHE_KEY
+    ttl_setting = 'INGREDIENT_INDEX_TTL'
+    empty = ([], [])
+
+    def load(self):
+        rows = sorted(
+            (normalize(name), id, name, measurement_unit)
+            for id, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        )
+        return (
+            [row[0] for row in rows],
+            [
+                {'id': id, 'name': name, 'measurement_unit': unit}
+                for _, id, name, unit in rows
+            ],
+        )
+
+    def search(self, prefix='', limit=None):
+        """Ингредиенты, название которых начинается с prefix.
+
+        Точное совпадение идёт первым, затем более короткие названия,
+        затем по алфавиту. Без prefix возвращаются все ингредиенты.
+        """
+        return self.search_data(self.get_data(), prefix, limit)
+
+    @staticmethod
+    def search_data(data, prefix, limit):
+        """search по уже загруженным данным индекса."""
+        keys, items = data
+        prefix = normalize(prefix)
+        if not prefix:
+            return items if limit is None else items[:limit]
+        start = bisect_left(keys, prefix)
+        end = bisect_right(keys, prefix + '\uffff', lo=start)
+        matches = range(start, end)
+        ranked = nsmallest(
+            len(matches) if limit is None else limit,
+            matches,
+            key=lambda index: (keys[index] != prefix, len(keys[index]), index)
+        )
+        return [items[index] for index in ranked]
+
+
+ingredient_index = IngredientIndex()
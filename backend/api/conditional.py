@@ -0,0 +1,110 @@
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription, User
+
+# Связи пользователя, от которых зависят флаги в ответах API:
+# is_favorited, is_in_shopping_cart и is_subscribed.
+USER_STATE = (
+    (Favorite, 'user'),
+    (ShoppingCart, 'user'),
+    (Subscription, 'user'),
+)
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5(
+        repr(parts).encode(), usedforsecurity=False
+    ).hexdigest())
+
+
+def user_state_query(user):
+    """Запрос версии избранного, корзины и подписок пользователя.
+
+    Для каждой таблицы берутся число строк пользователя и наибольший id:
+    добавление строки увеличивает id, удаление уменьшает число строк,
+    так что любое изменение меняет версию.
+    """
+    annotations = {}
+    for model, field in USER_STATE:
+        rows = model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field)
+        name = model._meta.model_name
+        annotations[f'{name}_count'] = Subquery(
+            rows.annotate(total=Count('pk')).values('total')
+        )
+        annotations[f'{name}_last'] = Subquery(
+            rows.annotate(last=Max('pk')).values('last')
+        )
+    return User.objects.filter(pk=user.pk).annotate(
+        **annotations
+    ).values_list('pk', *annotations)
+
+
+def user_state(user):
+    if not user.is_authenticated:
+        return None
+    return user_state_query(user).first()
+
+
+def finalize(response, etag, last_modified, per_user):
+    """Добавляет к ответу валидаторы условного GET и Vary."""
+    if response.status_code in (200, 304):
+        if etag:
+            response.headers.setdefault('ETag', etag)
+        if last_modified and response.status_code == 200:
+            response.headers.setdefault(
+                'Last-Modified', http_date(last_modified)
+            )
+    if per_user:
+        patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+def conditional_get(etag_func=None, last_modified_func=None,
+                    per_user=False):
+    """Условный GET для метода вьюсета.
+
+    Как django.views.decorators.http.condition, но функции получают
+    вьюсет и могут пользоваться его фильтрами. Валидаторы считаются
+    до вызова метода, так что на совпавший If-None-Match или
+    If-Modified-Since ответ 304 отдаётся без сериализации. Функция
+    может вернуть None, тогда запрос обрабатывается как обычно.
+    per_user добавляет к ETag состояние текущего пользователя и
+    Vary: Authorization к ответу. Пара (ETag, Last-Modified) доступна
+    как validators декорированного метода - ею пользуются асинхронные
+    view.
+    """
+    def validators(self, request, *args, **kwargs):
+        etag = last_modified = None
+        if etag_func is not None:
+            value = etag_func(self, request, *args, **kwargs)
+            if value is not None:
+                if per_user:
+                    value = (value, user_state(request.user))
+                etag = make_etag(value)
+        if last_modified_func is not None:
+            value = last_modified_func(self, request, *args, **kwargs)
+            if value is not None:
+                last_modified = int(value.timestamp())
+        return etag, last_modified
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            etag, last_modified = validators(self, request, *args, **kwargs)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = method(self, request, *args, **kwargs)
+            return finalize(response, etag, last_modified, per_user)
+        wrapper.validators = validators
+        return wrapper
+    return decorator
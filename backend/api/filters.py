@@ -1,6 +1,51 @@
+from functools import reduce
+from operator import and_
+
 import django_filters
+from django import forms
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import (
+    Case, Exists, F, IntegerField, OuterRef, Q, Value, When
+)
+from django.db.models.functions import Lower
+
+from recipes.models import Recipe, TagRecipe
+from .pantry import pantry_index
+from .registry import tag_registry
+
+# Конфигурация полнотекстового поиска PostgreSQL; та же, что в триггере
+# миграции recipes 0010, которым заполняется Recipe.search_vector.
+SEARCH_CONFIG = 'pg_catalog.russian'
+
+# Сортировки ленты по параметру ordering; без него - по дате.
+POPULAR = 'popular'
+ORDERINGS = {
+    POPULAR: ('-popularity', '-pub_date', '-id'),
+}
+
+
+class Casefold(Lower):
+    """Строка в нижнем регистре для сравнения без учёта регистра.
+
+    В SQLite - функция CASEFOLD, которую api.signals регистрирует
+    для каждого соединения: встроенная LOWER() там не знает кириллицы.
+    """
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, function='CASEFOLD', **extra_context
+        )
+
+
+def tag_choices():
+    return tag_registry.choices()
+
 
-from recipes.models import Recipe, Tag
+class IdInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    """Список целых id через запятую."""
+
+    field_class = forms.IntegerField
 
 
 class RecipeFilter(django_filters.FilterSet):
@@ -8,15 +53,24 @@ class RecipeFilter(django_filters.FilterSet):
     is_in_shopping_cart = django_filters.NumberFilter(
         method='is_in_shopping_cart_filter'
     )
-    tags = django_filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+    tags = django_filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='tags_filter'
+    )
+    search = django_filters.CharFilter(method='search_filter')
+    pantry = IdInFilter(method='pantry_filter')
+    pantry_complete = django_filters.NumberFilter(method='skip_filter')
+    ordering = django_filters.ChoiceFilter(
+        choices=((POPULAR, 'По популярности'),),
+        method='ordering_filter'
     )
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags')
+        fields = (
+            'is_favorited', 'is_in_shopping_cart', 'author', 'tags', 'search',
+            'pantry', 'pantry_complete', 'ordering'
+        )
 
     def is_favorited_filter(self, queryset, name, value):
         if value == 1 and self.request.user.is_authenticated:
@@ -27,3 +81,79 @@ class RecipeFilter(django_filters.FilterSet):
         if value == 1 and self.request.user.is_authenticated:
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
+
+    def tags_filter(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов, без JOIN и DISTINCT.
+
+        Slug переводятся в id по реестру тегов, так что тегами
+        занимается один подзапрос EXISTS.
+        """
+        return queryset.filter(Exists(TagRecipe.objects.filter(
+            recipe=OuterRef('pk'), tag_id__in=tag_registry.ids(value)
+        )))
+
+    def search_filter(self, queryset, name, value):
+        """Поиск по названию и описанию, самые релевантные рецепты первыми.
+
+        На PostgreSQL - полнотекстовый поиск по Recipe.search_vector
+        (GIN-индекс, русская морфология, синтаксис websearch: "фраза",
+        -исключение, or). На других БД каждое слово запроса должно
+        встречаться в названии или описании без учёта регистра,
+        в том числе кириллицы, совпадения в названии выше.
+        В курсорном режиме ленты порядок остаётся по дате.
+        """
+        if not value.strip():
+            return queryset
+        if connections[queryset.db].vendor == 'postgresql':
+            query = SearchQuery(
+                value, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            queryset = queryset.filter(search_vector=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query)
+            )
+        else:
+            # icontains и LOWER() в SQLite меняют регистр только
+            # у латиницы, поэтому обе стороны приводятся casefold().
+            words = value.casefold().split()
+            queryset = queryset.alias(
+                name_folded=Casefold('name'), text_folded=Casefold('text')
+            ).filter(reduce(and_, (
+                Q(name_folded__contains=word) | Q(text_folded__contains=word)
+                for word in words
+            ))).annotate(search_rank=Case(
+                When(reduce(and_, (
+                    Q(name_folded__contains=word) for word in words
+                )), then=Value(1.0)),
+                default=Value(0.5),
+            ))
+        return queryset.order_by('-search_rank', '-pub_date', '-id')
+
+    def pantry_filter(self, queryset, name, value):
+        """Рецепты из продуктов пользователя: pantry=1,2,3 - id ингредиентов.
+
+        Лучше всего покрытые рецепты первыми: по доле их ингредиентов,
+        которые есть у пользователя, затем по числу таких ингредиентов.
+        С pantry_complete=1 - только рецепты, для которых есть все
+        ингредиенты. Рецепты подбирает обратный индекс в памяти
+        процесса, в запрос попадают только их id.
+        """
+        groups = pantry_index.match(
+            value, complete=self.form.cleaned_data.get('pantry_complete') == 1
+        )
+        return queryset.filter(
+            pk__in=[pk for recipes in groups for pk in recipes]
+        ).annotate(pantry_rank=Case(
+            *(
+                When(pk__in=recipes, then=Value(rank))
+                for rank, recipes in enumerate(groups)
+            ),
+            output_field=IntegerField(),
+        )).order_by('pantry_rank', '-pub_date', '-id')
+
+    def ordering_filter(self, queryset, name, value):
+        """Сортировка ленты, заменяет порядок поиска и подбора."""
+        return queryset.order_by(*ORDERINGS[value])
+
+    def skip_filter(self, queryset, name, value):
+        """Параметр, который учитывает другой фильтр."""
+        return queryset
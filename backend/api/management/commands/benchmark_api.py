@@ -0,0 +1,617 @@
+import gc
+import json
+import os
+import re
+import statistics
+import tempfile
+import time
+from itertools import cycle, islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, get_resolver
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache
+from api.autocomplete import ingredient_index
+from api.pantry import pantry_index
+from api.registry import tag_registry
+from jobs.models import Job
+from recipes.models import (
+    Favorite, Ingredient, IngredientRecipe,
+    Recipe, ShoppingCart, SimilarRecipe, Tag, TagRecipe
+)
+from recipes.utils import get_short_link
+from users.models import Subscription, User
+
+BUDGETS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    'query_budgets.json'
+)
+# Нижняя граница бюджета времени ответа: замеры на CI заметно шумят.
+TIME_BUDGET_MIN_MS = 500
+# Маршруты с этими префиксами должны быть покрыты случаями get_cases().
+BENCHMARKED_PREFIXES = ('api/', 's/')
+# Настройки на время проверки: загруженные изображения не должны
+# попасть в MEDIA_ROOT проекта, а письма (сброс пароля) - уйти.
+# Хеширование паролей заняло бы почти всё время ответа на вход
+# и смену пароля, поэтому используется быстрый хешер.
+BENCHMARK_SETTINGS = {
+    'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+    'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+}
+# Пароль пользователя, от имени которого идут запросы.
+PASSWORD = 'Bench-password-1'
+# Кто выполняет запросы случая: первый элемент случая в get_cases().
+CLIENTS = {
+    False: ('anon', 'user'),
+    True: ('user',),
+    'admin': ('admin',),
+}
+# Прозрачный PNG 1x1 для запросов на создание рецепта.
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=='
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет число SQL-запросов и время ответа всех эндпоинтов API '
+        'на тестовом наборе данных. Все изменения в БД откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=30)
+        parser.add_argument('--recipes', type=int, default=200)
+        parser.add_argument('--ingredients', type=int, default=300)
+        parser.add_argument('--tags', type=int, default=6)
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1, 10, 50],
+            help='Размеры страниц (или числа строк в запросе).'
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--budgets', default=BUDGETS_PATH)
+        parser.add_argument(
+            '--output', default=None,
+            help='Путь к JSON-отчёту для сравнения между коммитами.'
+        )
+        parser.add_argument(
+            '--write-budgets', action='store_true',
+            help='Перезаписать файл бюджетов текущими измерениями.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(**BENCHMARK_SETTINGS), \
+                override_settings(MEDIA_ROOT=media_root), \
+                transaction.atomic():
+            self.seed()
+            cases = self.get_cases()
+            self.check_routes(cases)
+            results = self.run_cases(cases)
+            transaction.set_rollback(True)
+        budgets = self.load_budgets()
+        failures = self.check_budgets(results, budgets)
+        report = {
+            'database': connection.vendor,
+            'dataset': {
+                key: options[key]
+                for key in ('users', 'recipes', 'ingredients', 'tags')
+            },
+            'sizes': options['sizes'],
+            'results': results,
+            'failures': failures,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        if options['write_budgets']:
+            self.write_budgets(results, budgets)
+            return
+        for failure in failures:
+            self.stderr.write(failure)
+        if failures:
+            raise CommandError(f'Превышено бюджетов: {len(failures)}.')
+        self.stdout.write(self.style.SUCCESS('Все бюджеты соблюдены.'))
+
+    def seed(self):
+        """Создаёт пользователей, рецепты, теги, ингредиенты и связи."""
+        options = self.options
+        self.users = User.objects.bulk_create(
+            User(
+                username=f'bench{i}', email=f'bench{i}@example.com',
+                first_name='Имя', last_name='Фамилия',
+            )
+            for i in range(options['users'])
+        )
+        self.tags = Tag.objects.bulk_create(
+            Tag(name=f'Бенчмарк {i}', slug=f'bench-{i}')
+            for i in range(options['tags'])
+        )
+        self.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(options['ingredients'])
+        )
+        authors = cycle(self.users)
+        self.recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=next(authors), name=f'Рецепт {i}', text='Описание',
+                image='images/recipes/bench.png', cooking_time=10,
+            )
+            for i in range(options['recipes'])
+        )
+        for recipe in self.recipes:
+            recipe.short_link = get_short_link(recipe.pk)
+        Recipe.objects.bulk_update(self.recipes, ['short_link'])
+        tag_links, ingredient_links = [], []
+        for i, recipe in enumerate(self.recipes):
+            for tag in islice(cycle(self.tags), i, i + 1 + i % 3):
+                tag_links.append(TagRecipe(tag=tag, recipe=recipe))
+            for ingredient in islice(
+                cycle(self.ingredients), i, i + 3 + i % 8
+            ):
+                ingredient_links.append(IngredientRecipe(
+                    ingredient=ingredient, recipe=recipe, amount=i % 50 + 1
+                ))
+        TagRecipe.objects.bulk_create(tag_links)
+        IngredientRecipe.objects.bulk_create(ingredient_links)
+        favorites, carts, subscriptions = [], [], []
+        for i, user in enumerate(self.users):
+            for recipe in self.recipes[i::3]:
+                favorites.append(Favorite(user=user, recipe=recipe))
+            for recipe in self.recipes[i::5]:
+                carts.append(ShoppingCart(user=user, recipe=recipe))
+            for author in self.users[i + 1:]:
+                subscriptions.append(
+                    Subscription(user=user, subscribed_to=author)
+                )
+        Favorite.objects.bulk_create(favorites)
+        ShoppingCart.objects.bulk_create(carts)
+        Subscription.objects.bulk_create(subscriptions)
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe=self.recipes[0], similar=recipe, score=1 / i)
+            for i, recipe in enumerate(self.recipes[1:11], 1)
+        )
+        # Первый пользователь - автор рецепта recipes[0], рецепт в его
+        # избранном и списке покупок, он подписан на всех, кроме users[1].
+        self.viewer = self.users[0]
+        self.viewer.set_password(PASSWORD)
+        self.viewer.save(update_fields=['password'])
+        Subscription.objects.filter(
+            user=self.viewer, subscribed_to=self.users[1]
+        ).delete()
+        self.token = Token.objects.create(user=self.viewer)
+        self.admin = User.objects.create(
+            username='bench-admin', email='bench-admin@example.com',
+            first_name='Имя', last_name='Фамилия', is_staff=True
+        )
+        self.admin_token = Token.objects.create(user=self.admin)
+        self.jobs = Job.objects.bulk_create(
+            Job(
+                name='shopping_cart.export', user=self.viewer,
+                payload={'format': 'txt'}, status=Job.DONE
+            )
+            for _ in range(max(options['sizes']))
+        )
+
+    def get_cases(self):
+        """Эндпоинты из api/urls.py и параметры масштабирования.
+
+        Ключ - название случая, значение - пара: кто выполняет запросы
+        (ключ CLIENTS: False - аноним и пользователь, True - только
+        пользователь, 'admin' - администратор) и построитель запроса.
+        Каждый случай - функция, которая по размеру size возвращает
+        метод, URL, тело запроса и, если нужно, заголовки. Число
+        запросов к БД не должно зависеть от size.
+        """
+        recipe = self.recipes[0]
+        other = self.users[-1]
+        new_author = self.users[1]
+        ingredients = self.ingredients
+        tags = self.tags
+        viewer = self.viewer
+        respond_async = {'HTTP_PREFER': 'respond-async'}
+        next_pages = {}
+
+        def next_page(url):
+            """Ссылка на вторую страницу курсорной выдачи url."""
+            if url not in next_pages:
+                response = self.get_client('user').get(url)
+                if not response.data['next']:
+                    raise CommandError(f'Нет второй страницы: {url}')
+                next_pages[url] = response.data['next']
+            return next_pages[url]
+
+        def recipe_data(size):
+            return {
+                'name': 'Новый рецепт', 'text': 'Описание',
+                'cooking_time': 5, 'image': IMAGE,
+                'tags': [tag.id for tag in tags[:min(size, len(tags))]],
+                'ingredients': [
+                    {'id': ingredient.id, 'amount': 10}
+                    for ingredient in ingredients[:size]
+                ],
+            }
+
+        return {
+            'GET /api/': (False, lambda size: ('get', '/api/', None)),
+            'GET /api/ingredients/': (False, lambda size: (
+                'get', '/api/ingredients/?name=ингредиент', None)),
+            'GET /api/ingredients/{id}/': (False, lambda size: (
+                'get', f'/api/ingredients/{ingredients[0].id}/', None)),
+            'GET /api/tags/': (False, lambda size: (
+                'get', '/api/tags/', None)),
+            'GET /api/tags/{id}/': (False, lambda size: (
+                'get', f'/api/tags/{tags[0].id}/', None)),
+            'GET /api/recipes/': (False, lambda size: (
+                'get', f'/api/recipes/?limit={size}', None)),
+            'GET /api/recipes/?tags': (False, lambda size: (
+                'get', f'/api/recipes/?limit={size}&tags={tags[0].slug}'
+                f'&tags={tags[1].slug}', None)),
+            'GET /api/recipes/?is_favorited': (True, lambda size: (
+                'get', f'/api/recipes/?limit={size}&is_favorited=1', None)),
+            'GET /api/recipes/?is_in_shopping_cart': (True, lambda size: (
+                'get', f'/api/recipes/?limit={size}&is_in_shopping_cart=1',
+                None)),
+            'GET /api/recipes/?ordering=popular': (False, lambda size: (
+                'get', f'/api/recipes/?limit={size}&ordering=popular', None)),
+            'GET /api/recipes/?search': (False, lambda size: (
+                'get', f'/api/recipes/?limit={size}&search=рецепт', None)),
+            'GET /api/recipes/?cursor': (False, lambda size: (
+                'get', f'/api/recipes/?limit={size}&cursor=', None)),
+            'GET /api/recipes/?cursor (next page)': (False, lambda size: (
+                'get', next_page(f'/api/recipes/?limit={size}&cursor='),
+                None)),
+            'GET /api/recipes/?ordering=popular&cursor (next page)': (
+                False, lambda size: (
+                    'get', next_page(
+                        f'/api/recipes/?limit={size}&ordering=popular'
+                        '&cursor='
+                    ), None)),
+            'GET /api/recipes/?pantry': (False, lambda size: (
+                'get', f'/api/recipes/?limit={size}&pantry=' + ','.join(
+                    str(ingredient.id) for ingredient in ingredients[:5]
+                ), None)),
+            'GET /api/recipes/{id}/': (False, lambda size: (
+                'get', f'/api/recipes/{recipe.id}/', None)),
+            'GET /api/recipes/{id}/similar/': (False, lambda size: (
+                'get', f'/api/recipes/{recipe.id}/similar/', None)),
+            'GET /api/recipes/{id}/get-link/': (False, lambda size: (
+                'get', f'/api/recipes/{recipe.id}/get-link/', None)),
+            'GET /s/{short_link}': (False, lambda size: (
+                'get', f'/s/{recipe.short_link}', None)),
+            'GET /api/recipes/download_shopping_cart/': (True, lambda size: (
+                'get', '/api/recipes/download_shopping_cart/', None)),
+            'GET /api/recipes/download_shopping_cart/ (async)': (
+                True, lambda size: (
+                    'get', '/api/recipes/download_shopping_cart/', None,
+                    respond_async)),
+            'POST /api/recipes/': (True, lambda size: (
+                'post', '/api/recipes/', recipe_data(size))),
+            'PUT /api/recipes/{id}/': (True, lambda size: (
+                'put', f'/api/recipes/{recipe.id}/', recipe_data(size))),
+            'PATCH /api/recipes/{id}/': (True, lambda size: (
+                'patch', f'/api/recipes/{recipe.id}/',
+                recipe_data(size))),
+            'DELETE /api/recipes/{id}/': (True, lambda size: (
+                'delete', f'/api/recipes/{recipe.id}/', None)),
+            'POST /api/recipes/{id}/favorite/': (True, lambda size: (
+                'post', f'/api/recipes/{self.recipes[1].id}/favorite/',
+                None)),
+            'DELETE /api/recipes/{id}/favorite/': (True, lambda size: (
+                'delete', f'/api/recipes/{recipe.id}/favorite/', None)),
+            'POST /api/recipes/{id}/shopping_cart/': (True, lambda size: (
+                'post', f'/api/recipes/{self.recipes[1].id}/shopping_cart/',
+                None)),
+            'DELETE /api/recipes/{id}/shopping_cart/': (True, lambda size: (
+                'delete', f'/api/recipes/{recipe.id}/shopping_cart/', None)),
+            'GET /api/users/': (False, lambda size: (
+                'get', f'/api/users/?limit={size}', None)),
+            'POST /api/users/': (False, lambda size: (
+                'post', '/api/users/', {
+                    'email': 'new@example.com', 'username': 'new',
+                    'first_name': 'Имя', 'last_name': 'Фамилия',
+                    'password': PASSWORD,
+                })),
+            'GET /api/users/{id}/': (False, lambda size: (
+                'get', f'/api/users/{other.id}/', None)),
+            'PUT /api/users/{id}/': (True, lambda size: (
+                'put', f'/api/users/{viewer.id}/', {
+                    'email': viewer.email, 'username': viewer.username,
+                    'first_name': 'Новое имя', 'last_name': 'Фамилия',
+                    'avatar': IMAGE,
+                })),
+            'PATCH /api/users/{id}/': (True, lambda size: (
+                'patch', f'/api/users/{viewer.id}/',
+                {'first_name': 'Новое имя'})),
+            'DELETE /api/users/{id}/': (True, lambda size: (
+                'delete', f'/api/users/{viewer.id}/',
+                {'current_password': PASSWORD})),
+            'GET /api/users/me/': (True, lambda size: (
+                'get', '/api/users/me/', None)),
+            'GET /api/users/subscriptions/': (True, lambda size: (
+                'get', f'/api/users/subscriptions/?limit={size}'
+                f'&recipes_limit={size}', None)),
+            # Подписок у viewer меньше max(sizes): страница из одного
+            # автора, масштабируется число его рецептов.
+            'GET /api/users/subscriptions/?cursor (next page)': (
+                True, lambda size: (
+                    'get', next_page(
+                        '/api/users/subscriptions/?limit=1'
+                        f'&recipes_limit={size}&cursor='
+                    ), None)),
+            'POST /api/users/{id}/subscribe/': (True, lambda size: (
+                'post', f'/api/users/{new_author.id}/subscribe/'
+                f'?recipes_limit={size}', None)),
+            'DELETE /api/users/{id}/subscribe/': (True, lambda size: (
+                'delete', f'/api/users/{other.id}/subscribe/', None)),
+            'PUT /api/users/me/avatar/': (True, lambda size: (
+                'put', '/api/users/me/avatar/', {'avatar': IMAGE})),
+            'PUT /api/users/me/avatar/ (async)': (True, lambda size: (
+                'put', '/api/users/me/avatar/', {'avatar': IMAGE},
+                respond_async)),
+            'DELETE /api/users/me/avatar/': (True, lambda size: (
+                'delete', '/api/users/me/avatar/', None)),
+            'GET /api/jobs/': (True, lambda size: (
+                'get', f'/api/jobs/?limit={size}', None)),
+            'GET /api/jobs/{id}/': (True, lambda size: (
+                'get', f'/api/jobs/{self.jobs[0].id}/', None)),
+            'GET /api/db-pool/': ('admin', lambda size: (
+                'get', '/api/db-pool/', None)),
+            'POST /api/auth/token/login/': (False, lambda size: (
+                'post', '/api/auth/token/login/',
+                {'email': viewer.email, 'password': PASSWORD})),
+            'POST /api/auth/token/logout/': (True, lambda size: (
+                'post', '/api/auth/token/logout/', None)),
+            'POST /api/users/set_password/': (True, lambda size: (
+                'post', '/api/users/set_password/', {
+                    'current_password': PASSWORD,
+                    'new_password': 'New-bench-password-1',
+                })),
+            'POST /api/users/set_email/': (True, lambda size: (
+                'post', '/api/users/set_email/', {
+                    'current_password': PASSWORD,
+                    'new_email': 'renamed@example.com',
+                })),
+            # Письма для сброса не отправляются: адрес ни к кому
+            # не относится, как и в большинстве таких запросов.
+            'POST /api/users/reset_password/': (False, lambda size: (
+                'post', '/api/users/reset_password/',
+                {'email': 'nobody@example.com'})),
+            'POST /api/users/reset_password_confirm/': (False, lambda size: (
+                'post', '/api/users/reset_password_confirm/', {
+                    'uid': 'bench', 'token': 'bench',
+                    'new_password': 'New-bench-password-1',
+                })),
+            'POST /api/users/reset_email/': (False, lambda size: (
+                'post', '/api/users/reset_email/',
+                {'email': 'nobody@example.com'})),
+            'POST /api/users/reset_email_confirm/': (False, lambda size: (
+                'post', '/api/users/reset_email_confirm/', {
+                    'uid': 'bench', 'token': 'bench',
+                    'new_email': 'renamed@example.com',
+                })),
+            'POST /api/users/activation/': (False, lambda size: (
+                'post', '/api/users/activation/',
+                {'uid': 'bench', 'token': 'bench'})),
+            'POST /api/users/resend_activation/': (False, lambda size: (
+                'post', '/api/users/resend_activation/',
+                {'email': viewer.email})),
+        }
+
+    def get_client(self, user):
+        host = settings.ALLOWED_HOSTS[0].strip()
+        client = APIClient(HTTP_HOST='localhost' if host == '*' else host)
+        token = {'user': self.token, 'admin': self.admin_token}.get(user)
+        if token is not None:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def measure(self, client, method, url, data, headers=None):
+        """Выполняет запрос в точке сохранения, которая затем откатывается.
+
+        Как и в timeit, сборщик мусора на время замера отключается,
+        чтобы его паузы не попадали во время ответа.
+        """
+        gc.collect()
+        gc.disable()
+        try:
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    response = getattr(client, method)(
+                        url, data, format='json', **(headers or {})
+                    )
+                    if getattr(response, 'streaming', False):
+                        b''.join(response.streaming_content)
+                    elapsed = time.perf_counter() - start
+                transaction.set_rollback(True)
+        finally:
+            gc.enable()
+        return response.status_code, len(context), elapsed * 1000
+
+    @staticmethod
+    def get_routes():
+        """Пары (метод, путь) всех маршрутов с BENCHMARKED_PREFIXES.
+
+        Путь записывается так же, как в названиях случаев: параметры
+        pk и id - {id}, остальные - {имя}. Маршруты с суффиксом
+        формата (.json) не перечисляются отдельно.
+        """
+        def walk(patterns, prefix):
+            for pattern in patterns:
+                route = prefix + str(pattern.pattern).lstrip('^')
+                if isinstance(pattern, URLResolver):
+                    yield from walk(pattern.url_patterns, route)
+                else:
+                    yield route, pattern.callback
+
+        routes = set()
+        for route, view in walk(get_resolver().url_patterns, ''):
+            if (
+                not route.startswith(BENCHMARKED_PREFIXES)
+                or 'format' in route
+            ):
+                continue
+            path = re.sub(
+                r'\(\?P<(\w+)>[^)]*\)|<(?:\w+:)?(\w+)>',
+                lambda match: '{%s}' % (
+                    'id' if (match[1] or match[2]) in ('id', 'pk')
+                    else match[1] or match[2]
+                ),
+                route
+            ).replace('$', '').replace('/?', '/')
+            if hasattr(view, 'actions'):
+                methods = view.actions
+            elif hasattr(view, 'cls'):
+                methods = [
+                    method for method in view.cls.http_method_names
+                    if method not in ('head', 'options')
+                    and hasattr(view.cls, method)
+                ]
+            else:
+                methods = ['get']
+            routes.update((method.upper(), '/' + path) for method in methods)
+        return routes
+
+    def check_routes(self, cases):
+        """Проверяет, что у каждого маршрута API есть случай.
+
+        Путь случая может подставлять значение параметра маршрута,
+        например /api/users/me/avatar/ для /api/users/{id}/avatar/.
+        """
+        covered = [
+            re.split(r'[? ]', name, maxsplit=2)[:2] for name in cases
+        ]
+        missing = sorted(
+            (method, path) for method, path in self.get_routes()
+            if not any(
+                case_method == method and re.fullmatch(
+                    re.sub(r'\\{\w+\\}', '[^/]+', re.escape(path)),
+                    case_path
+                )
+                for case_method, case_path in covered
+            )
+        )
+        if missing:
+            raise CommandError(
+                'Нет случаев для маршрутов: ' + ', '.join(
+                    f'{method} {path}' for method, path in missing
+                ) + '.'
+            )
+
+    def run_cases(self, cases):
+        """Измеряет каждый эндпоинт от имени клиентов из CLIENTS."""
+        results = []
+        for name, (clients, build) in cases.items():
+            for user in CLIENTS[clients]:
+                client = self.get_client(user)
+                for size in self.options['sizes']:
+                    # Первый повтор идёт с пустыми кешами, и в бюджет
+                    # попадает худший из повторов: N+1 на холодном пути
+                    # не прячется за прогретым кешем.
+                    self.reset_caches()
+                    statuses, counts, timings = [], [], []
+                    for _ in range(self.options['repeat']):
+                        status, queries, elapsed = self.measure(
+                            client, *build(size)
+                        )
+                        statuses.append(status)
+                        counts.append(queries)
+                        timings.append(elapsed)
+                    status, queries = statuses[0], max(counts)
+                    results.append({
+                        'endpoint': name,
+                        'user': user,
+                        'size': size,
+                        'status': status,
+                        'queries': queries,
+                        'time_ms': round(statistics.median(timings), 2),
+                    })
+                    self.stdout.write(
+                        f'{name} [{user}] size={size}: {status}, '
+                        f'{queries} запросов, '
+                        f'{results[-1]["time_ms"]} мс'
+                    )
+        return results
+
+    @staticmethod
+    def reset_caches():
+        """Сбрасывает общий кеш и данные в памяти процесса."""
+        cache.clear()
+        token_cache.clear()
+        for registry in (tag_registry, ingredient_index, pantry_index):
+            registry.built_at = None
+
+    def load_budgets(self):
+        try:
+            with open(self.options['budgets'], encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def group(self, results):
+        grouped = {}
+        for result in results:
+            key = f'{result["endpoint"]} [{result["user"]}]'
+            grouped.setdefault(key, []).append(result)
+        return grouped
+
+    def check_budgets(self, results, budgets):
+        """Сравнивает измерения с бюджетами и ищет рост числа запросов."""
+        failures = []
+        for key, measurements in self.group(results).items():
+            budget = budgets.get(key)
+            if budget is None:
+                failures.append(f'{key}: нет бюджета.')
+                continue
+            counts = {m['size']: m['queries'] for m in measurements}
+            if (
+                len(set(counts.values())) > 1
+                and not budget.get('allow_growth')
+            ):
+                failures.append(
+                    f'{key}: число запросов растёт с размером: {counts}.'
+                )
+            queries = max(counts.values())
+            if queries > budget['queries']:
+                failures.append(
+                    f'{key}: {queries} запросов при бюджете '
+                    f'{budget["queries"]}.'
+                )
+            time_ms = max(m['time_ms'] for m in measurements)
+            if time_ms > budget['time_ms']:
+                failures.append(
+                    f'{key}: {time_ms} мс при бюджете {budget["time_ms"]} мс.'
+                )
+        return failures
+
+    def write_budgets(self, results, budgets):
+        """Сохраняет бюджеты с большим запасом по времени и без запаса
+        по запросам: время ответа зависит от машины, число запросов - нет.
+        """
+        for key, measurements in self.group(results).items():
+            counts = {m['size']: m['queries'] for m in measurements}
+            budget = budgets.get(key, {})
+            budget['queries'] = max(counts.values())
+            budget['time_ms'] = max(
+                TIME_BUDGET_MIN_MS,
+                round(max(m['time_ms'] for m in measurements) * 5)
+            )
+            if len(set(counts.values())) > 1:
+                budget['allow_growth'] = True
+            else:
+                budget.pop('allow_growth', None)
+            budgets[key] = budget
+        with open(self.options['budgets'], 'w', encoding='utf-8') as f:
+            json.dump(budgets, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write('\n')
+        self.stdout.write(self.style.SUCCESS(
+            f'Бюджеты записаны в {self.options["budgets"]}.'
+        ))
@@ -0,0 +1,121 @@
+import json
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections
+
+from foodgram_backend.postgresql_pool.pool import get_pool
+from recipes.models import Recipe
+
+# Режимы сравнения: бэкенд БД для каждого.
+ENGINES = {
+    'direct': 'django.db.backends.postgresql',
+    'pooled': 'foodgram_backend.postgresql_pool',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает задержку запросов с пулом соединений и без него. '
+        'Каждый клиент в своём потоке повторяет то, что делает Django '
+        'при обработке запроса с CONN_MAX_AGE=0: открывает соединение, '
+        'читает страницу ленты рецептов и закрывает соединение.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--clients', type=int, default=8)
+        parser.add_argument(
+            '--requests', type=int, default=100,
+            help='Сколько запросов делает каждый клиент.'
+        )
+        parser.add_argument(
+            '--pool-size', type=int, default=None,
+            help='Размер пула; по умолчанию POOL["SIZE"] из настроек БД.'
+        )
+        parser.add_argument(
+            '--output', default=None,
+            help='Путь к JSON-отчёту с результатами.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        base = connections[options['database']].settings_dict
+        if connections[options['database']].vendor != 'postgresql':
+            raise CommandError('Пул соединений работает только с PostgreSQL.')
+        pool = dict(base.get('POOL', {}))
+        if options['pool_size'] is not None:
+            pool['SIZE'] = options['pool_size']
+        report = {}
+        for mode, engine in ENGINES.items():
+            alias = f'benchmark_{mode}'
+            connections.settings[alias] = {
+                **base, 'ENGINE': engine, 'POOL': pool
+            }
+            try:
+                report[mode] = self.load(alias)
+                if mode == 'pooled':
+                    report[mode]['pool'] = get_pool(alias, pool).stats()
+                    get_pool(alias, pool).close()
+            finally:
+                del connections.settings[alias]
+            self.print_result(mode, report[mode])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def load(self, alias):
+        """Нагружает БД clients потоками по requests запросов."""
+        latencies, errors = [], []
+        lock = threading.Lock()
+        queryset = Recipe.objects.using(alias).select_related(
+            'author'
+        ).defer('search_vector').order_by('-pub_date', '-id')
+
+        def client():
+            connection = connections[alias]
+            for _ in range(self.options['requests']):
+                started = time.monotonic()
+                try:
+                    list(queryset[:6])
+                except DatabaseError as error:
+                    with lock:
+                        errors.append(type(error).__name__)
+                else:
+                    with lock:
+                        latencies.append(time.monotonic() - started)
+                finally:
+                    connection.close()
+
+        threads = [
+            threading.Thread(target=client)
+            for _ in range(self.options['clients'])
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'errors': len(errors),
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(statistics.median(latencies) * 1000, 2)
+            if latencies else None,
+            'p95_ms': round(
+                latencies[int(len(latencies) * 0.95)] * 1000, 2
+            ) if latencies else None,
+        }
+
+    def print_result(self, mode, result):
+        self.stdout.write(
+            f'{mode}: {result["requests"]} запросов, '
+            f'ошибок {result["errors"]}, {result["rps"]} в секунду, '
+            f'p50 {result["p50_ms"]} мс, p95 {result["p95_ms"]} мс'
+        )
+        if 'pool' in result:
+            self.stdout.write(f'  пул: {result["pool"]}')
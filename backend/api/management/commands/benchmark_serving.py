@@ -0,0 +1,148 @@
+import json
+import socket
+import statistics
+import threading
+import time
+from itertools import cycle
+from urllib.parse import quote, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Горячие эндпоинты чтения, которые обслуживают асинхронные view.
+DEFAULT_PATHS = (
+    '/api/recipes/', '/api/recipes/?limit=10', '/api/tags/',
+    '/api/ingredients/?name=а',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность запущенных серверов (например, '
+        'gunicorn с WSGI и с ASGI) при одновременных медленных клиентах. '
+        'Клиент отправляет запрос частями в течение --trickle секунд, '
+        'как медленная мобильная сеть, и читает ответ небольшими порциями.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'targets', nargs='+', metavar='NAME=URL',
+            help='Серверы для сравнения, например '
+                 'wsgi=http://127.0.0.1:8001 asgi=http://127.0.0.1:8002.'
+        )
+        parser.add_argument(
+            '--paths', nargs='+', default=DEFAULT_PATHS,
+            help='Адреса, которые клиенты запрашивают по кругу.'
+        )
+        parser.add_argument('--clients', type=int, default=50)
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность нагрузки на каждый сервер, в секундах.'
+        )
+        parser.add_argument(
+            '--trickle', type=float, default=0.5,
+            help='За сколько секунд клиент отправляет запрос.'
+        )
+        parser.add_argument(
+            '--read-size', type=int, default=1024,
+            help='Размер порции, которой клиент читает ответ, в байтах.'
+        )
+        parser.add_argument('--token', default=None)
+        parser.add_argument(
+            '--output', default=None,
+            help='Путь к JSON-отчёту с результатами.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        targets = []
+        for target in options['targets']:
+            name, _, url = target.partition('=')
+            parts = urlsplit(url)
+            if not name or parts.scheme != 'http' or not parts.hostname:
+                raise CommandError(
+                    f'{target}: ожидается NAME=http://host:port.'
+                )
+            targets.append((name, parts.hostname, parts.port or 80))
+        report = {}
+        for name, host, port in targets:
+            report[name] = self.load(host, port)
+            self.print_result(name, report[name])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def load(self, host, port):
+        """Нагружает сервер clients потоками в течение duration секунд."""
+        deadline = time.monotonic() + self.options['duration']
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def client(paths):
+            while time.monotonic() < deadline:
+                path = next(paths)
+                started = time.monotonic()
+                try:
+                    status = self.request(host, port, path)
+                except OSError as error:
+                    status = type(error).__name__
+                with lock:
+                    if isinstance(status, int) and status < 400:
+                        latencies.append(time.monotonic() - started)
+                    else:
+                        errors.append(status)
+
+        paths = self.options['paths']
+        threads = [
+            threading.Thread(target=client, args=(
+                cycle(paths[index % len(paths):] + paths[:index % len(paths)]),
+            ))
+            for index in range(self.options['clients'])
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'errors': len(errors),
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(statistics.median(latencies) * 1000, 1)
+            if latencies else None,
+            'p95_ms': round(
+                latencies[int(len(latencies) * 0.95)] * 1000, 1
+            ) if latencies else None,
+        }
+
+    def request(self, host, port, path):
+        """Медленный GET: возвращает код ответа."""
+        headers = [
+            f'GET {quote(path, safe="/?=&%")} HTTP/1.1',
+            f'Host: {host}:{port}',
+            'Accept: application/json', 'Connection: close',
+        ]
+        if self.options['token']:
+            headers.append(f'Authorization: Token {self.options["token"]}')
+        data = ('\r\n'.join(headers) + '\r\n\r\n').encode()
+        chunks = [data[index:index + 16] for index in range(0, len(data), 16)]
+        pause = self.options['trickle'] / len(chunks)
+        with socket.create_connection((host, port), timeout=30) as sock:
+            for chunk in chunks:
+                sock.sendall(chunk)
+                time.sleep(pause)
+            response = b''
+            while True:
+                chunk = sock.recv(self.options['read_size'])
+                if not chunk:
+                    break
+                response += chunk
+        return int(response.split(b' ', 2)[1])
+
+    def print_result(self, name, result):
+        self.stdout.write(
+            f'{name}: {result["requests"]} запросов, {result["rps"]} в '
+            f'секунду, p50 {result["p50_ms"]} мс, p95 {result["p95_ms"]} мс, '
+            f'ошибок {result["errors"]}.'
+        )
@@ -0,0 +1,136 @@
+import json
+import re
+from itertools import combinations
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.views import RecipeViewSet
+from recipes.models import IngredientRecipe, Recipe, Tag
+from users.models import User
+
+FILTERS = (
+    'author', 'tags', 'is_favorited', 'is_in_shopping_cart', 'search',
+    'pantry', 'ordering',
+)
+SQLITE_SCAN = re.compile(r'\bSCAN (\w+)\b(?! USING)')
+SQLITE_SORT = re.compile(r'USE TEMP B-TREE FOR ([\w ]+)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN для запроса ленты рецептов со всеми '
+        'сочетаниями фильтров RecipeFilter и сообщает о полных '
+        'просмотрах таблиц и сортировках.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', default=None,
+            help='Email пользователя, от имени которого строятся запросы.'
+        )
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument(
+            '--force-index', action='store_true',
+            help='На PostgreSQL запретить планировщику Seq Scan, чтобы '
+                 'проверить применимость индексов на маленьких таблицах.'
+        )
+        parser.add_argument(
+            '--plans', action='store_true',
+            help='Выводить планы запросов целиком.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        user = self.get_user(options['user'])
+        values = {
+            'author': User.objects.order_by('-recipes_count').values_list(
+                'id', flat=True
+            ).first(),
+            'tags': list(Tag.objects.values_list('slug', flat=True)[:2]),
+            'is_favorited': 1,
+            'is_in_shopping_cart': 1,
+            'search': Recipe.objects.values_list('name', flat=True).first(),
+            'pantry': ','.join(map(str, IngredientRecipe.objects.values_list(
+                'ingredient_id', flat=True
+            )[:3])),
+            'ordering': 'popular',
+        }
+        if None in (values['author'], values['search']) or not values['tags']:
+            raise CommandError('В БД нет рецептов или тегов для проверки.')
+        problems = 0
+        with transaction.atomic():
+            if options['force_index'] and connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for size in range(len(FILTERS) + 1):
+                for names in combinations(FILTERS, size):
+                    params = {name: values[name] for name in names}
+                    plan = self.explain(user, params)
+                    issues = self.find_issues(plan)
+                    problems += bool(issues)
+                    self.report(names, plan, issues)
+        self.stdout.write(
+            f'Запросов с полными просмотрами или сортировками: {problems}.'
+        )
+
+    def get_user(self, email):
+        users = User.objects.order_by('-id')
+        if email:
+            users = users.filter(email=email)
+        user = users.first()
+        if user is None:
+            raise CommandError('Пользователь не найден.')
+        return user
+
+    def explain(self, user, params):
+        """План запроса страницы ленты с фильтрами params."""
+        request = Request(APIRequestFactory().get('/api/recipes/', params))
+        request.user = user
+        view = RecipeViewSet(
+            request=request, action='list', args=(), kwargs={},
+            format_kwarg=None
+        )
+        queryset = view.filter_queryset(view.get_queryset())
+        queryset = queryset[:self.options['limit']]
+        if connection.vendor == 'postgresql':
+            return json.loads(queryset.explain(format='json'))[0]['Plan']
+        return queryset.explain()
+
+    def find_issues(self, plan):
+        if connection.vendor == 'postgresql':
+            return list(self.walk_postgresql_plan(plan))
+        if connection.vendor == 'sqlite':
+            issues = [
+                f'полный просмотр {table}'
+                for table in SQLITE_SCAN.findall(plan)
+            ]
+            issues.extend(
+                f'сортировка для {clause}'
+                for clause in SQLITE_SORT.findall(plan)
+            )
+            return issues
+        return []
+
+    def walk_postgresql_plan(self, node):
+        if node['Node Type'] == 'Seq Scan':
+            yield f'полный просмотр {node["Relation Name"]}'
+        elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+            yield f'сортировка по {", ".join(node["Sort Key"])}'
+        for child in node.get('Plans', ()):
+            yield from self.walk_postgresql_plan(child)
+
+    def report(self, names, plan, issues):
+        title = ', '.join(names) or 'без фильтров'
+        if issues:
+            self.stdout.write(self.style.WARNING(
+                f'{title}: {"; ".join(issues)}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{title}: замечаний нет'))
+        if self.options['plans']:
+            if not isinstance(plan, str):
+                plan = json.dumps(plan, ensure_ascii=False, indent=2)
+            self.stdout.write(plan)
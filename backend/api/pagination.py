@@ -1,6 +1,192 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = 6
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по ключу (keyset) без COUNT(*) и OFFSET.
+
+    Курсор хранит значения полей ordering последнего (или первого)
+    объекта страницы, следующая страница выбирается условием
+    "строго после этого ключа". Поля ordering должны вместе
+    однозначно определять объект, поэтому последним идёт id.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = 6
+    max_page_size = 100
+    ordering = ('-id',)
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self.invert(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        self.page = results[:page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {
+                    'type': 'string', 'nullable': True, 'format': 'uri'
+                },
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size < 1:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def after(self, ordering, position):
+        """Условие "ключ строго после position" для заданного ordering.
+
+        Для ключа (a, b) и убывающего порядка это
+        a < a0 OR (a = a0 AND b < b0).
+        """
+        conditions = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {
+                previous.lstrip('-'): position[previous.lstrip('-')]
+                for previous in ordering[:index]
+            }
+            equal[f'{name}__{lookup}'] = position[name]
+            conditions.append(Q(**equal))
+        return reduce(or_, conditions)
+
+    def encode_cursor(self, obj, reverse):
+        values = [
+            self.model._meta.get_field(field.lstrip('-')).value_to_string(obj)
+            for field in self.ordering
+        ]
+        cursor = urlsafe_b64encode(
+            json.dumps({'p': values, 'r': reverse}).encode()
+        ).decode()
+        return replace_query_param(
+            remove_query_param(self.base_url, 'page'),
+            self.cursor_query_param, cursor
+        )
+
+    def decode_cursor(self, request):
+        """Возвращает (значения полей ordering, направление) из курсора."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+            values = cursor['p']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = {}
+            for field, value in zip(self.ordering, values):
+                name = field.lstrip('-')
+                position[name] = self.model._meta.get_field(
+                    name
+                ).to_python(value)
+            return position, bool(cursor.get('r'))
+        except (KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class RecipeCursorPagination(KeysetPagination):
+    """Курсорная пагинация рецептов в порядке Recipe.Meta.ordering."""
+
+    ordering = ('-pub_date', '-id')
+
+
+class PopularRecipeCursorPagination(KeysetPagination):
+    """Курсорная пагинация рецептов, отсортированных по популярности."""
+
+    ordering = ('-popularity', '-pub_date', '-id')
+
+
+class KeysetPaginationMixin:
+    """Включает курсорную пагинацию по параметру cursor в запросе.
+
+    Без параметра cursor используется pagination_class, так что
+    контракт page/limit для текущего фронтенда не меняется.
+    Первая страница в курсорном режиме запрашивается с пустым cursor.
+    """
+
+    cursor_pagination_classes = {}
+
+    def get_cursor_pagination_class(self):
+        return self.cursor_pagination_classes.get(self.action)
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.get_cursor_pagination_class()
+            if (
+                pagination_class is not None
+                and pagination_class.cursor_query_param
+                in self.request.query_params
+            ):
+                self._paginator = pagination_class()
+            else:
+                return super().paginator
+        return self._paginator
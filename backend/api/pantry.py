@@ -0,0 +1,146 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from foodgram_backend.replicas import use_primary
+from recipes.models import IngredientRecipe
+from .registry import ProcessRegistry
+
+
+class PantryIndex(ProcessRegistry):
+    """Обратный индекс "ингредиент - рецепты" в памяти процесса.
+
+    Хранит для каждого ингредиента множество id рецептов с ним и число
+    ингредиентов каждого рецепта, так что подбор рецептов по продуктам
+    пользователя не обращается к БД. Строится одним запросом к
+    IngredientRecipe и перестраивается целиком по истечении
+    PANTRY_INDEX_TTL.
+
+    После изменения ингредиентов рецептов changed() увеличивает версию
+    в общем кеше и записывает под ней id этих рецептов. Процесс,
+    отставший не больше чем на PANTRY_INDEX_MAX_CHANGES версий,
+    перечитывает из БД только ингредиенты рецептов из пропущенных
+    изменений; если какое-то из них уже вытеснено из кеша, индекс
+    строится заново.
+    """
+
+    version_cache_key = 'pantry-index-version'
+    changes_cache_key = 'pantry-index-changes-{}'
+    ttl_setting = 'PANTRY_INDEX_TTL'
+    empty = ({}, {})
+    with_digest = False
+
+    def load(self):
+        recipes_by_ingredient = defaultdict(set)
+        sizes = Counter()
+        for ingredient_id, recipe_id in IngredientRecipe.objects.values_list(
+            'ingredient_id', 'recipe_id'
+        ).order_by('ingredient_id', 'recipe_id').iterator():
+            recipes_by_ingredient[ingredient_id].add(recipe_id)
+            sizes[recipe_id] += 1
+        return (
+            {
+                ingredient_id: frozenset(recipes)
+                for ingredient_id, recipes in recipes_by_ingredient.items()
+            },
+            dict(sizes),
+        )
+
+    def changed(self, recipes):
+        """Помечает изменёнными ингредиенты рецептов recipes."""
+        try:
+            version = cache.incr(self.version_cache_key)
+        except ValueError:
+            # Версии в кеше нет: её получит следующая перестройка.
+            self.invalidate()
+            return
+        cache.set(
+            self.changes_cache_key.format(version), list(recipes),
+            getattr(settings, self.ttl_setting)
+        )
+
+    def build(self):
+        if self.is_expired() or not self.catch_up():
+            super().build()
+
+    def catch_up(self):
+        """Применяет пропущенные изменения; False - их нужно перестроить."""
+        version = cache.get(self.version_cache_key)
+        if version is None or not (
+            0 < version - self.version <= settings.PANTRY_INDEX_MAX_CHANGES
+        ):
+            return False
+        keys = [
+            self.changes_cache_key.format(number)
+            for number in range(self.version + 1, version + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return False
+        with use_primary():
+            self.data = self.patch(set().union(*changes.values()))
+        self.version = version
+        return True
+
+    def patch(self, recipes):
+        """Данные индекса с перечитанными из БД ингредиентами recipes.
+
+        Собирает новые словари, не меняя текущие: их могут читать
+        другие потоки.
+        """
+        old, sizes = self.data
+        new = defaultdict(set)
+        sizes = {
+            recipe_id: size for recipe_id, size in sizes.items()
+            if recipe_id not in recipes
+        }
+        for ingredient_id, recipe_id in IngredientRecipe.objects.filter(
+            recipe_id__in=recipes
+        ).values_list('ingredient_id', 'recipe_id'):
+            new[ingredient_id].add(recipe_id)
+            sizes[recipe_id] = sizes.get(recipe_id, 0) + 1
+        recipes_by_ingredient = dict(old)
+        for ingredient_id in new.keys() | {
+            ingredient_id for ingredient_id, recipe_ids in old.items()
+            if not recipe_ids.isdisjoint(recipes)
+        }:
+            recipe_ids = (
+                old.get(ingredient_id, frozenset()) - recipes
+            ) | new[ingredient_id]
+            if recipe_ids:
+                recipes_by_ingredient[ingredient_id] = frozenset(recipe_ids)
+            else:
+                del recipes_by_ingredient[ingredient_id]
+        return recipes_by_ingredient, sizes
+
+    def match(self, ingredients, complete=False):
+        """Рецепты, которые можно приготовить из ingredients, лучшие первыми.
+
+        Возвращает список групп id рецептов, упорядоченный
+        по убыванию доли ингредиентов рецепта, которые есть в
+        ingredients, а при равной доле - по числу таких ингредиентов.
+        С complete остаются только рецепты, для которых есть все
+        ингредиенты. В группы попадают не больше PANTRY_MAX_RESULTS
+        рецептов; неизвестные id ингредиентов пропускаются.
+        """
+        recipes_by_ingredient, sizes = self.get_data()
+        matched = Counter()
+        for ingredient_id in set(ingredients):
+            matched.update(recipes_by_ingredient.get(ingredient_id, ()))
+        groups = defaultdict(list)
+        for recipe_id, count in matched.items():
+            size = sizes[recipe_id]
+            if not complete or count == size:
+                groups[count / size, count].append(recipe_id)
+        result, left = [], settings.PANTRY_MAX_RESULTS
+        for key in sorted(groups, reverse=True):
+            if left <= 0:
+                break
+            recipes = sorted(groups[key], reverse=True)[:left]
+            left -= len(recipes)
+            result.append(recipes)
+        return result
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,128 @@
+import hashlib
+import time
+from threading import Lock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from foodgram_backend.replicas import use_primary
+from recipes.models import Tag
+
+
+class ProcessRegistry:
+    """Данные справочника из БД, хранящиеся в памяти процесса.
+
+    Загружаются одним запросом и перезагружаются, если справочник
+    изменился: в этом процессе - сразу, в других - по версии в общем
+    кеше или по истечении времени из настройки ttl_setting.
+    Подклассы задают version_cache_key, ttl_setting и load().
+    digest - хеш содержимого, одинаковый во всех процессах
+    с одинаковыми данными; из него строится ETag ответов. Для больших
+    справочников, которые не отдаются с ETag, with_digest = False:
+    хеш repr() всех данных дорог, и digest остаётся None.
+    """
+
+    version_cache_key = None
+    ttl_setting = None
+    empty = None
+    with_digest = True
+
+    def __init__(self):
+        self.lock = Lock()
+        self.data = self.empty
+        self.digest = None
+        self.version = None
+        self.built_at = None
+
+    def load(self):
+        raise NotImplementedError
+
+    def invalidate(self):
+        """Помечает данные устаревшими во всех процессах."""
+        self.built_at = None
+        cache.set(self.version_cache_key, time.time_ns(), None)
+
+    def is_expired(self):
+        if self.built_at is None:
+            return True
+        ttl = getattr(settings, self.ttl_setting)
+        return time.monotonic() - self.built_at > ttl
+
+    def is_fresh(self):
+        if self.is_expired():
+            return False
+        return cache.get(self.version_cache_key) == self.version
+
+    async def ais_fresh(self):
+        if self.is_expired():
+            return False
+        return await cache.aget(self.version_cache_key) == self.version
+
+    def build(self):
+        version = cache.get_or_set(
+            self.version_cache_key, time.time_ns(), None
+        )
+        # Справочник живёт до TTL, поэтому не читается с реплики,
+        # которая могла ещё не получить последние изменения.
+        with use_primary():
+            self.data = self.load()
+        if self.with_digest:
+            self.digest = hashlib.md5(
+                repr(self.data).encode(), usedforsecurity=False
+            ).hexdigest()
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def ensure_fresh(self):
+        if not self.is_fresh():
+            with self.lock:
+                if not self.is_fresh():
+                    self.build()
+
+    def get_data(self):
+        self.ensure_fresh()
+        return self.data
+
+    def get_digest(self):
+        self.ensure_fresh()
+        return self.digest
+
+    async def aget_data(self):
+        """get_data для асинхронных view: в потоке - только перестройка."""
+        if not await self.ais_fresh():
+            await sync_to_async(self.ensure_fresh)()
+        return self.data
+
+
+class TagRegistry(ProcessRegistry):
+    """Теги в памяти процесса: список для API и id по slug для фильтров."""
+
+    version_cache_key = 'tag-registry-version'
+    ttl_setting = 'TAG_REGISTRY_TTL'
+    empty = ([], {}, {})
+
+    def load(self):
+        tags = list(Tag.objects.order_by('id').values('id', 'name', 'slug'))
+        return (
+            tags,
+            {tag['id']: tag for tag in tags},
+            {tag['slug']: tag['id'] for tag in tags},
+        )
+
+    def all(self):
+        return self.get_data()[0]
+
+    def get(self, pk):
+        return self.get_data()[1].get(pk)
+
+    def ids(self, slugs):
+        """id тегов с заданными slug, неизвестные slug пропускаются."""
+        ids_by_slug = self.get_data()[2]
+        return [ids_by_slug[slug] for slug in slugs if slug in ids_by_slug]
+
+    def choices(self):
+        return [(tag['slug'], tag['name']) for tag in self.all()]
+
+
+tag_registry = TagRegistry()
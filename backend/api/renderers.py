@@ -0,0 +1,28 @@
+from rest_framework import renderers
+
+
+class ShoppingCartRendererMixin:
+    """Рендерер для выбора формата файла со списком покупок.
+
+    Сам файл отдаётся потоком StreamingHttpResponse в обход рендерера,
+    через render() проходят только ответы с ошибками.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data).encode(self.charset)
+
+
+class PlainTextRenderer(ShoppingCartRendererMixin, renderers.BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(ShoppingCartRendererMixin, renderers.BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
@@ -1,15 +1,26 @@
 import base64
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
-from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import (
+    F, Prefetch, Window, prefetch_related_objects
+)
+from django.db.models.functions import RowNumber
+from django.urls import reverse
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from djoser.serializers import UserSerializer, UserCreateSerializer
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
+from jobs.models import Job
+from recipes.images import MAX_IMAGE_PIXELS
 from recipes.models import (
     Favorite, Ingredient, IngredientRecipe,
-    Recipe, ShoppingCart, Tag, TagRecipe
+    Recipe, ShoppingCart, ShoppingListItem, Tag, TagRecipe
 )
+from recipes.signals import recipe_ingredients_changed
 from users.models import Subscription, User
 
 
@@ -20,15 +31,85 @@ class Base64ImageField(serializers.ImageField):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
+        file = super().to_internal_value(data)
+        width, height = file.image.size
+        if width * height > MAX_IMAGE_PIXELS:
+            raise serializers.ValidationError(
+                f'Изображение больше {MAX_IMAGE_PIXELS} пикселей.'
+            )
+        return file
+
+
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии изображения по названию варианта."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for variant, path in value.items():
+            if variant == 'source':
+                continue
+            url = default_storage.url(path)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[variant] = url
+        return urls
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список первичных ключей, проверяемый одним запросом к БД."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        pks = []
+        for pk in data:
+            if isinstance(pk, bool):
+                child.fail('incorrect_type', data_type=type(pk).__name__)
+            try:
+                pks.append(int(pk))
+            except (TypeError, ValueError):
+                child.fail('incorrect_type', data_type=type(pk).__name__)
+        objects = child.get_queryset().in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                child.fail('does_not_exist', pk_value=pk)
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, который при many=True не делает
+    отдельный запрос для каждого ключа.
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
 
 
 class CheckMixin(serializers.ModelSerializer):
 
-    def checking_fields(self, model, obj):
+    def checking_fields(self, model, obj, field_name):
         """Получает значения True или False для полей:
         is_subscribed, is_favorited, is_in_shopping_cart.
+
+        Если значение уже посчитано аннотацией в queryset,
+        дополнительный запрос к БД не выполняется.
         """
+        annotated = getattr(obj, field_name, None)
+        if annotated is not None:
+            return annotated
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
@@ -62,16 +143,19 @@ class CustomUserSerializer(UserSerializer, CheckMixin):
 
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField()
+    avatar_variants = ImageVariantsField()
 
     class Meta:
         model = User
         fields = (
             'email', 'id', 'username', 'first_name',
-            'last_name', 'is_subscribed', 'avatar'
+            'last_name', 'is_subscribed', 'avatar', 'avatar_variants'
         )
 
     def get_is_subscribed(self, obj):
-        return self.checking_fields(model=Subscription, obj=obj)
+        return self.checking_fields(
+            model=Subscription, obj=obj, field_name='is_subscribed'
+        )
 
 
 class AvatarSerializer(CustomUserSerializer):
@@ -79,7 +163,7 @@ class AvatarSerializer(CustomUserSerializer):
 
     class Meta:
         model = User
-        fields = ('avatar',)
+        fields = ('avatar', 'avatar_variants')
 
     def validate(self, data):
         if not data.get('avatar'):
@@ -135,8 +219,38 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'slug')
 
 
+def prefetch_recipe_relations(recipes):
+    """Загружает теги и ингредиенты рецептов двумя запросами."""
+    prefetch_related_objects(
+        recipes,
+        'tags',
+        Prefetch(
+            'ingredients_in_recipe',
+            queryset=IngredientRecipe.objects.select_related('ingredient')
+        ),
+    )
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Сериализатор списка рецептов.
+
+    Общие для всех пользователей части ответов берутся из кеша
+    одним запросом get_many, связи загружаются только для промахов.
+    """
+
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, 'all') else data)
+        if self.context.get('request') is not None:
+            self.child.load_shared_representations(recipes)
+        return [self.child.to_representation(recipe) for recipe in recipes]
+
+
 class RecipeReadSerializer(CheckMixin):
-    """Сериализатор для модели Recipe при GET-запросах."""
+    """Сериализатор для модели Recipe при GET-запросах.
+
+    Ответ собирается из общей части, которая кешируется по id рецепта
+    и его версии updated_at, и флагов текущего пользователя.
+    """
 
     tags = TagSerializer(many=True)
     author = CustomUserSerializer()
@@ -146,26 +260,86 @@ class RecipeReadSerializer(CheckMixin):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
-            'name', 'image', 'text', 'cooking_time',
+            'name', 'image', 'image_variants', 'text', 'cooking_time',
+        )
+        list_serializer_class = RecipeListSerializer
+
+    @staticmethod
+    def get_cache_key(recipe):
+        return f'recipe:{recipe.pk}:{recipe.updated_at.timestamp()}'
+
+    def load_shared_representations(self, recipes):
+        """Загружает общие части ответов из кеша, недостающие строит."""
+        keys = {self.get_cache_key(recipe): recipe for recipe in recipes}
+        cached = cache.get_many(keys)
+        missing = {
+            key: recipe for key, recipe in keys.items() if key not in cached
+        }
+        prefetch_recipe_relations(list(missing.values()))
+        fresh = {
+            key: RecipeReadSerializer(recipe).data
+            for key, recipe in missing.items()
+        }
+        cache.set_many(fresh, settings.RECIPE_CACHE_TIMEOUT)
+        for key, recipe in keys.items():
+            recipe.shared_representation = cached.get(key) or fresh[key]
+
+    def to_representation(self, instance):
+        request = self.context.get('request')
+        if request is None:
+            # Без запроса флаги равны False, а ссылки относительные,
+            # то есть это и есть общая для всех часть ответа.
+            return super().to_representation(instance)
+        if not hasattr(instance, 'shared_representation'):
+            self.load_shared_representations([instance])
+        data = dict(instance.shared_representation)
+        author = dict(data['author'])
+        for container, field in ((data, 'image'), (author, 'avatar')):
+            if container[field]:
+                container[field] = request.build_absolute_uri(
+                    container[field]
+                )
+            variants = f'{field}_variants'
+            container[variants] = {
+                variant: request.build_absolute_uri(url)
+                for variant, url in container[variants].items()
+            }
+        author['is_subscribed'] = self.get_author_is_subscribed(instance)
+        data['author'] = author
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        return data
+
+    def get_author_is_subscribed(self, obj):
+        annotated = getattr(obj, 'author_is_subscribed', None)
+        if annotated is not None:
+            return annotated
+        return self.checking_fields(
+            model=Subscription, obj=obj.author, field_name='is_subscribed'
         )
 
     def get_is_favorited(self, obj):
-        return self.checking_fields(model=Favorite, obj=obj)
+        return self.checking_fields(
+            model=Favorite, obj=obj, field_name='is_favorited'
+        )
 
     def get_is_in_shopping_cart(self, obj):
-        return self.checking_fields(model=ShoppingCart, obj=obj)
+        return self.checking_fields(
+            model=ShoppingCart, obj=obj, field_name='is_in_shopping_cart'
+        )
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для модели Recipe при POST, PATCH, DELETE запросах."""
 
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True, allow_empty=False
     )
     ingredients = IngredientForRecipeCreateSerializer(
@@ -201,34 +375,37 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         return value
 
     def validate_ingredients(self, value):
-        ingredients_id = []
-        for ingredient in value:
-            id = ingredient['id']
-            try:
-                Ingredient.objects.get(id=id)
-            except ObjectDoesNotExist:
+        ingredients_id = [ingredient['id'] for ingredient in value]
+        existing = set(Ingredient.objects.filter(
+            id__in=ingredients_id
+        ).values_list('id', flat=True))
+        seen = set()
+        for id in ingredients_id:
+            if id not in existing:
                 raise serializers.ValidationError(
                     f'Ингредиента с id={id} не существует!'
                 )
-            if id in ingredients_id:
+            if id in seen:
                 raise serializers.ValidationError(
                     'Ингредиенты не должны повторяться!'
                 )
-            ingredients_id.append(id)
+            seen.add(id)
         return value
 
     def create_tags(self, tags, recipe):
-        for tag in tags:
-            TagRecipe.objects.create(tag=tag, recipe=recipe)
+        TagRecipe.objects.bulk_create(
+            TagRecipe(tag=tag, recipe=recipe) for tag in tags
+        )
 
     def create_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
-            current_ingredient = Ingredient.objects.get(pk=ingredient['id'])
-            IngredientRecipe.objects.create(
-                ingredient=current_ingredient,
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                ingredient_id=ingredient['id'],
                 recipe=recipe,
                 amount=ingredient['amount']
             )
+            for ingredient in ingredients
+        )
 
     def get_tags(self, data):
         return data.pop('tags')
@@ -243,6 +420,9 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         self.create_ingredients(ingredients, recipe)
         self.create_tags(tags, recipe)
+        recipe_ingredients_changed.send(
+            sender=self.__class__, recipes={recipe.pk}
+        )
         return recipe
 
     @transaction.atomic
@@ -250,15 +430,30 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         TagRecipe.objects.filter(recipe=instance).delete()
         self.create_tags(self.get_tags(validated_data), instance)
 
-        IngredientRecipe.objects.filter(recipe=instance).delete()
-        self.create_ingredients(self.get_ingredients(validated_data), instance)
+        ingredients = self.get_ingredients(validated_data)
+        old = dict(IngredientRecipe.objects.filter(
+            recipe=instance
+        ).values_list('ingredient_id', 'amount'))
+        new = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        if new != old:
+            IngredientRecipe.objects.filter(recipe=instance).delete()
+            self.create_ingredients(ingredients, instance)
+            ShoppingListItem.objects.change_recipe(instance, old, new)
+        # Индексу продуктов важен только набор ингредиентов.
+        if new.keys() != old.keys():
+            recipe_ingredients_changed.send(
+                sender=self.__class__, recipes={instance.pk}
+            )
 
-        instance = super().update(instance, validated_data)
-        instance.save()
-        return instance
+        # Сохранение рецепта обновляет и его версию updated_at.
+        return super().update(instance, validated_data)
 
     def to_representation(self, instance):
         """Сериализация ответа на POST-запрос."""
+        prefetch_recipe_relations([instance])
         serializer = RecipeReadSerializer(instance)
         return serializer.data
 
@@ -271,9 +466,11 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
     UserWithRecipesSerializer.
     """
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time',)
 
 
 class FavoriteShoppingCartMixin(serializers.ModelSerializer):
@@ -312,24 +509,71 @@ class ShoppingCartSerializer(FavoriteShoppingCartMixin):
         read_only_fields = ('user', 'recipe',)
 
 
+RECIPES_LIMIT_PARAM = 'recipes_limit'
+LATEST_RECIPES_ORDERING = ('-pub_date', '-id')
+
+
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или None, если он не передан."""
+    value = request.query_params.get(RECIPES_LIMIT_PARAM)
+    if not value:
+        return None
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise serializers.ValidationError(
+            {RECIPES_LIMIT_PARAM: 'Должно быть целым положительным числом.'}
+        )
+    return limit
+
+
+def with_latest_recipes(authors, recipes_limit=None):
+    """Подгружает рецепты авторов.
+
+    Последние recipes_limit рецептов всех авторов загружаются одним
+    запросом: рецепты нумеруются ROW_NUMBER() в пределах автора,
+    и отбираются первые номера.
+    """
+    recipes = Recipe.objects.order_by(*LATEST_RECIPES_ORDERING)
+    if recipes_limit is not None:
+        recipes = recipes.annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=LATEST_RECIPES_ORDERING,
+            )
+        ).filter(row_number__lte=recipes_limit)
+    return authors.prefetch_related(
+        Prefetch('recipes', queryset=recipes, to_attr='latest_recipes')
+    )
+
+
 class UserWithRecipesSerializer(CustomUserSerializer):
-    """Сериализатор для модели User с его рецептами."""
+    """Сериализатор для модели User с его рецептами.
+
+    Если автор получен через with_latest_recipes, запросов к БД
+    для рецептов не выполняется.
+    """
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(source="recipes.count")
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
         fields = (
             'email', 'id', 'username', 'first_name', 'last_name',
-            'is_subscribed', 'recipes', 'recipes_count', 'avatar'
+            'is_subscribed', 'recipes', 'recipes_count', 'avatar',
+            'avatar_variants'
         )
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        recipes = getattr(obj, 'latest_recipes', None)
+        if recipes is None:
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            recipes = obj.recipes.order_by(*LATEST_RECIPES_ORDERING)
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         serializer = ShortRecipeSerializer(recipes, many=True)
         return serializer.data
 
@@ -343,7 +587,9 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         read_only_fields = ('user', 'subscribed_to',)
 
     def validate(self, data):
-        user = self.context.get('request').user
+        request = self.context.get('request')
+        get_recipes_limit(request)
+        user = request.user
         subscribed_to = self.context.get('subscribed_to')
         if user == subscribed_to:
             raise serializers.ValidationError(
@@ -363,3 +609,23 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             context=self.context
         )
         return serializer.data
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Сериализатор для модели Job: статус фоновой задачи."""
+
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = (
+            'id', 'url', 'name', 'status', 'attempts', 'result', 'error',
+            'created_at', 'finished_at'
+        )
+
+    def get_url(self, obj):
+        # Без параметра format запроса, поставившего задачу: у статуса
+        # задачи свой набор форматов.
+        return self.context['request'].build_absolute_uri(
+            reverse('job-detail', args=(obj.pk,))
+        )
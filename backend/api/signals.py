@@ -0,0 +1,76 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.signals import recipe_ingredients_changed
+from users.models import User
+from .authentication import token_cache
+from .autocomplete import ingredient_index
+from .pantry import pantry_index
+from .registry import tag_registry
+
+
+def casefold(value):
+    return None if value is None else value.casefold()
+
+
+@receiver(connection_created)
+def register_sqlite_functions(sender, connection, **kwargs):
+    # Для поиска без учёта регистра (api.filters.Casefold).
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function(
+            'CASEFOLD', 1, casefold, deterministic=True
+        )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tags_changed(sender, **kwargs):
+    transaction.on_commit(tag_registry.invalidate)
+
+
+# Индекс продуктов зависит только от ингредиентов рецептов: правка
+# названия, описания или тегов его не затрагивает, а после изменения
+# ингредиентов перечитываются записи только этих рецептов. Ингредиенты
+# удалённого рецепта удаляются каскадно.
+@receiver(recipe_ingredients_changed)
+def pantry_changed(sender, recipes, **kwargs):
+    transaction.on_commit(lambda: pantry_index.changed(recipes))
+
+
+@receiver(post_delete, sender=Recipe)
+def pantry_recipe_deleted(sender, instance, **kwargs):
+    # После удаления pk объекта сбрасывается в None.
+    recipes = {instance.pk}
+    transaction.on_commit(lambda: pantry_index.changed(recipes))
+
+
+# Пользователь из кеша токенов попадает в ответы (users/me), поэтому
+# его записи отзываются при любом изменении, кроме входа, а не только
+# при деактивации. Токены удалённого пользователя удаляются каскадно.
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    keys = list(
+        Token.objects.filter(user=instance).values_list('key', flat=True)
+    )
+    if keys:
+        transaction.on_commit(lambda: token_cache.invalidate(keys))
+
+
+# Выход (djoser.urls.authtoken) удаляет токен пользователя.
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # key - первичный ключ токена, после удаления он сбрасывается в None.
+    keys = [instance.key]
+    transaction.on_commit(lambda: token_cache.invalidate(keys))
@@ -0,0 +1,32 @@
+import json
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from jobs.runner import JobError, task
+from .serializers import AvatarSerializer
+from .utils import SHOPPING_CART_WRITERS, shopping_list
+
+
+@task('shopping_cart.export')
+def export_shopping_cart(job):
+    """Сохраняет список покупок в файл и возвращает ссылку на него."""
+    file_format = job.payload['format']
+    content = ''.join(SHOPPING_CART_WRITERS[file_format](
+        shopping_list(job.user)
+    ))
+    path = default_storage.save(
+        f'shopping_lists/{job.pk}.{file_format}',
+        ContentFile(content.encode())
+    )
+    return {'file': path, 'url': default_storage.url(path)}
+
+
+# Изображение в base64 после выполнения задачи больше не нужно.
+@task('users.avatar', clear_payload=True)
+def set_avatar(job):
+    serializer = AvatarSerializer(job.user, data=job.payload, partial=True)
+    if not serializer.is_valid():
+        raise JobError(json.dumps(serializer.errors, ensure_ascii=False))
+    serializer.save()
+    return serializer.data
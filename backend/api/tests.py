@@ -0,0 +1,83 @@
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, IngredientRecipe, Recipe
+from recipes.signals import recipe_ingredients_changed
+from users.models import User
+from .authentication import token_cache
+from .pantry import pantry_index
+
+
+class PantryIndexTests(TestCase):
+    """Изменения ингредиентов рецептов применяются к индексу по месту."""
+
+    def setUp(self):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='author', last_name='author', password='password'
+        )
+        self.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(4)
+        )
+        self.recipes = [
+            Recipe.objects.create(
+                author=author, name=f'Рецепт {i}', text='Описание',
+                cooking_time=10
+            )
+            for i in range(3)
+        ]
+        for recipe, ingredients in zip(self.recipes, ([0, 1], [1, 2], [3])):
+            self.set_ingredients(recipe, ingredients)
+        pantry_index.invalidate()
+        pantry_index.get_data()
+
+    def set_ingredients(self, recipe, ingredients):
+        IngredientRecipe.objects.filter(recipe=recipe).delete()
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe, ingredient=self.ingredients[i], amount=1
+            )
+            for i in ingredients
+        )
+
+    def assert_index_matches_database(self):
+        with mock.patch.object(
+            pantry_index, 'load', wraps=pantry_index.load
+        ) as load:
+            data = pantry_index.get_data()
+        load.assert_not_called()
+        self.assertEqual(data, pantry_index.load())
+
+    def test_changed_ingredients(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.set_ingredients(self.recipes[0], [2, 3])
+            self.set_ingredients(self.recipes[2], [])
+            recipe_ingredients_changed.send(
+                sender=IngredientRecipe,
+                recipes={self.recipes[0].pk, self.recipes[2].pk}
+            )
+        self.assert_index_matches_database()
+
+    def test_deleted_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[1].delete()
+        self.assert_index_matches_database()
+
+
+class TokenDeletedTests(TestCase):
+    """Удаление токена отзывает его запись в кеше токенов."""
+
+    def test_invalidates_deleted_key(self):
+        user = User.objects.create_user(
+            username='user', email='user@example.com',
+            first_name='user', last_name='user', password='password'
+        )
+        token = Token.objects.create(user=user)
+        key = token.key
+        with mock.patch.object(token_cache, 'invalidate') as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                token.delete()
+        invalidate.assert_called_once_with([key])
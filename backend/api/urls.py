@@ -1,8 +1,11 @@
-from django.urls import include, path
+from django.conf import settings
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
 from .views import (
-    CustomUserViewSet, IngredientViewSet, RecipeViewSet, TagViewSet
+    CustomUserViewSet, DatabasePoolView, IngredientViewSet, JobViewSet,
+    RecipeViewSet, TagViewSet
 )
 
 
@@ -12,9 +15,22 @@ router.register(r'ingredients', IngredientViewSet)
 router.register(r'tags', TagViewSet)
 router.register(r'recipes', RecipeViewSet)
 router.register(r'users', CustomUserViewSet)
+router.register(r'jobs', JobViewSet)
 
 
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('db-pool/', DatabasePoolView.as_view()),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    # Под ASGI горячие GET-запросы обслуживаются асинхронными view,
+    # они стоят перед маршрутами роутера с теми же адресами.
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list),
+        re_path(r'^recipes/(?P<pk>[^/.]+)/$', async_views.recipe_detail),
+        path('tags/', async_views.tag_list),
+        re_path(r'^tags/(?P<pk>[^/.]+)/$', async_views.tag_detail),
+        path('ingredients/', async_views.ingredient_list),
+    ] + urlpatterns
@@ -1,17 +1,14 @@
-import random
-from string import ascii_letters, digits
+import csv
+import json
 
+from django.db.models import F
 from django.shortcuts import get_object_or_404, redirect
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
 
-from recipes.models import Recipe
-
-
-def get_short_link(model):
-    while True:
-        short_link = ''.join(random.choices(ascii_letters + digits, k=5))
-        if not model.objects.filter(short_link=short_link).exists():
-            break
-    return short_link
+from recipes.models import Recipe, ShoppingListItem
+from .serializers import JobSerializer
 
 
 def recipe_redirection(request, short_link):
@@ -20,3 +17,75 @@ def recipe_redirection(request, short_link):
     return redirect(
         request.build_absolute_uri('/') + f'recipes/{recipe_id}/'
     )
+
+
+def prefers_async(request):
+    """Клиент просит выполнить запрос в фоне: Prefer: respond-async."""
+    preferences = request.headers.get('Prefer', '').split(',')
+    return 'respond-async' in (value.strip() for value in preferences)
+
+
+def accepted(request, job):
+    """Ответ 202 со статусом задачи и ссылкой на него в Location."""
+    request.accepted_renderer = JSONRenderer()
+    request.accepted_media_type = JSONRenderer.media_type
+    data = JobSerializer(job, context={'request': request}).data
+    return Response(
+        data, status=status.HTTP_202_ACCEPTED,
+        headers={
+            'Location': data['url'], 'Preference-Applied': 'respond-async'
+        }
+    )
+
+
+def shopping_list(user):
+    """Строки списка покупок пользователя, читаемые курсором."""
+    return ShoppingListItem.objects.filter(
+        user=user, amount__gt=0
+    ).values(
+        'amount',
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+    ).order_by('name').iterator()
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_cart_txt(ingredients):
+    for ingredient in ingredients:
+        yield (
+            f'{ingredient["name"]} ({ingredient["measurement_unit"]}) '
+            f'- {ingredient["amount"]}\n'
+        )
+
+
+def shopping_cart_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['name'],
+            ingredient['measurement_unit'],
+            ingredient['amount'],
+        ))
+
+
+def shopping_cart_json(ingredients):
+    yield '['
+    for index, ingredient in enumerate(ingredients):
+        yield (', ' if index else '') + json.dumps(
+            ingredient, ensure_ascii=False
+        )
+    yield ']'
+
+
+SHOPPING_CART_WRITERS = {
+    'txt': shopping_cart_txt,
+    'csv': shopping_cart_csv,
+    'json': shopping_cart_json,
+}
@@ -1,44 +1,74 @@
+import os
+
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Sum, Value
+from django.http import Http404, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from rest_framework import filters, permissions, status, viewsets
+from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from foodgram_backend.postgresql_pool.pool import pool_stats
+from jobs.models import Job
+from jobs.runner import enqueue
 from recipes.models import (
-    Favorite, Ingredient, IngredientRecipe,
-    Recipe, ShoppingCart, Tag
+    Favorite, Ingredient, Recipe, ShoppingCart, SimilarRecipe, Tag
 )
 from users.models import Subscription, User
-from .filters import RecipeFilter
-from .pagination import CustomPagination
+from .autocomplete import get_search_limit, ingredient_index
+from .conditional import conditional_get
+from .filters import POPULAR, RecipeFilter
+from .pagination import (
+    CustomPagination, KeysetPagination, KeysetPaginationMixin,
+    PopularRecipeCursorPagination, RecipeCursorPagination
+)
 from .permissions import IsAuthorOrReadOnly
+from .registry import tag_registry
+from .renderers import CSVRenderer, PlainTextRenderer
 from .serializers import (
     AvatarSerializer, CustomUserSerializer,
-    FavoriteSerializer, IngredientSerializer,
+    FavoriteSerializer, IngredientSerializer, JobSerializer,
     RecipeCreateSerializer, RecipeReadSerializer,
-    ShoppingCartSerializer, SubscriptionSerializer,
-    TagSerializer, UserWithRecipesSerializer
+    ShoppingCartSerializer, ShortRecipeSerializer, SubscriptionSerializer,
+    TagSerializer, UserWithRecipesSerializer,
+    get_recipes_limit, with_latest_recipes
+)
+from .utils import (
+    SHOPPING_CART_WRITERS, accepted, prefers_async, shopping_list
 )
-from .utils import get_short_link
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(KeysetPaginationMixin, UserViewSet):
     """Вьюсет для модели User."""
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     pagination_class = CustomPagination
+    cursor_pagination_classes = {'subscriptions': KeysetPagination}
 
     def get_queryset(self):
         if self.action == 'subscriptions':
             queryset = User.objects.filter(
                 subscription__user=self.request.user
+            ).annotate(is_subscribed=Value(True))
+            return with_latest_recipes(
+                queryset, get_recipes_limit(self.request)
             )
-            return queryset
-        return super().get_queryset()
+        queryset = super().get_queryset()
+        user = self.request.user
+        if self.action in ('list', 'retrieve') and user.is_authenticated:
+            # Флаг подписки - аннотацией, а не запросом на каждого
+            # пользователя страницы.
+            queryset = queryset.annotate(
+                is_subscribed=Exists(Subscription.objects.filter(
+                    user=user, subscribed_to=OuterRef('pk')
+                ))
+            )
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'avatar':
@@ -65,7 +95,17 @@ class CustomUserViewSet(UserViewSet):
         permission_classes=(permissions.IsAuthenticated,)
     )
     def avatar(self, request, **kwargs):
-        """Добавление аватара."""
+        """Добавление аватара.
+
+        С заголовком Prefer: respond-async изображение проверяется
+        и сохраняется в фоновой задаче, а ответ 202 содержит ссылку
+        на её статус.
+        """
+        if prefers_async(request):
+            return accepted(request, enqueue(
+                'users.avatar', user=request.user,
+                avatar=request.data.get('avatar')
+            ))
         serializer = self.get_serializer(
             request.user, data=request.data, partial=True
         )
@@ -104,7 +144,10 @@ class CustomUserViewSet(UserViewSet):
             context={'request': request, 'subscribed_to': self.get_object()}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save(user=request.user, subscribed_to=self.get_object())
+        with transaction.atomic():
+            serializer.save(
+                user=request.user, subscribed_to=self.get_object()
+            )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
@@ -121,23 +164,60 @@ class CustomUserViewSet(UserViewSet):
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
-    """Вьюсет для модели Ingredient."""
+    """Вьюсет для модели Ingredient.
+
+    Список с поиском по началу названия (параметр name) отдаётся
+    из индекса в памяти процесса без запросов к БД.
+    """
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (permissions.AllowAny,)
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('^name',)
+
+    def index_digest(self, request, *args, **kwargs):
+        return ingredient_index.get_digest()
+
+    @conditional_get(etag_func=index_digest)
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name', '')
+        return Response(ingredient_index.search(
+            name, get_search_limit(request)
+        ))
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
-    """Вьюсет для модели Tag."""
+    """Вьюсет для модели Tag.
+
+    Теги отдаются из реестра в памяти процесса без запросов к БД.
+    """
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (permissions.AllowAny,)
 
+    def registry_digest(self, request, *args, **kwargs):
+        return tag_registry.get_digest()
+
+    @conditional_get(etag_func=registry_digest)
+    def list(self, request, *args, **kwargs):
+        return Response(tag_registry.all())
+
+    @conditional_get(etag_func=registry_digest)
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            tag = tag_registry.get(int(kwargs[self.lookup_field]))
+        except ValueError:
+            raise Http404
+        if tag is None:
+            raise Http404('No Tag matches the given query.')
+        return Response(tag)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    """Вьюсет для модели Recipe."""
+class RecipeViewSet(KeysetPaginationMixin, viewsets.ModelViewSet):
+    """Вьюсет для модели Recipe.
+
+    Лента и рецепт поддерживают условный GET: ETag строится из
+    updated_at рецептов (для ленты - наибольшего и их числа после
+    фильтров) и состояния избранного, корзины и подписок пользователя.
+    """
     queryset = Recipe.objects.all()
     serializer_class = RecipeCreateSerializer
     permission_classes = (
@@ -147,12 +227,96 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = CustomPagination
+    cursor_pagination_classes = {'list': RecipeCursorPagination}
 
-    def perform_create(self, serializer):
-        serializer.save(
-            author=self.request.user,
-            short_link=get_short_link(Recipe)
+    def get_cursor_pagination_class(self):
+        if (
+            self.action == 'list'
+            and self.request.query_params.get('ordering') == POPULAR
+        ):
+            return PopularRecipeCursorPagination
+        return super().get_cursor_pagination_class()
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve'):
+            return self.get_read_queryset()
+        return super().get_queryset()
+
+    def get_read_queryset(self):
+        """Queryset для чтения рецептов за фиксированное число запросов.
+
+        Флаги is_favorited, is_in_shopping_cart и is_subscribed автора
+        считаются аннотациями Exists() для текущего пользователя.
+        Теги и ингредиенты RecipeReadSerializer подгружает сам и только
+        для рецептов, которых нет в кеше. Поисковый вектор в ответах
+        не нужен и не загружается.
+        """
+        user = self.request.user
+        queryset = Recipe.objects.select_related('author').defer(
+            'search_vector'
         )
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                author_is_subscribed=Exists(Subscription.objects.filter(
+                    user=user, subscribed_to=OuterRef('author')
+                )),
+            )
+        return queryset
+
+    def get_version_aggregates(self):
+        """Агрегаты версии ленты: последнее изменение и число рецептов.
+
+        Популярность пересчитывается без изменения updated_at, поэтому
+        для сортировки по ней в версию входит и сумма популярности.
+        """
+        aggregates = [Max('updated_at'), Count('pk')]
+        if self.request.query_params.get('ordering') == POPULAR:
+            aggregates.append(Sum('popularity'))
+        return aggregates
+
+    def list_version(self, request, *args, **kwargs):
+        """Версия отфильтрованной ленты."""
+        return tuple(self.filter_queryset(Recipe.objects.all()).aggregate(
+            *self.get_version_aggregates()
+        ).values())
+
+    def detail_version(self, request, *args, **kwargs):
+        if not hasattr(self, '_updated_at'):
+            try:
+                self._updated_at = Recipe.objects.filter(
+                    pk=kwargs['pk']
+                ).values_list('updated_at', flat=True).first()
+            except ValueError:
+                self._updated_at = None
+        return self._updated_at
+
+    def detail_last_modified(self, request, *args, **kwargs):
+        # Флаги пользователя не имеют даты изменения, поэтому
+        # Last-Modified отдаётся только анонимным пользователям.
+        if request.user.is_authenticated:
+            return None
+        return self.detail_version(request, *args, **kwargs)
+
+    @conditional_get(etag_func=list_version, per_user=True)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get(
+        etag_func=detail_version,
+        last_modified_func=detail_last_modified,
+        per_user=True
+    )
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        serializer.save(author=self.request.user)
 
     def get_serializer_class(self):
         if self.action == 'favorite':
@@ -161,6 +325,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return ShoppingCartSerializer
         if self.action in ('list', 'retrieve'):
             return RecipeReadSerializer
+        if self.action == 'similar':
+            return ShortRecipeSerializer
         return RecipeCreateSerializer
 
     @action(
@@ -177,6 +343,35 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=status.HTTP_200_OK
         )
 
+    @action(
+        detail=True,
+        methods=['get', ],
+        permission_classes=(permissions.AllowAny,),
+    )
+    def similar(self, request, **kwargs):
+        """Похожие рецепты, лучшие первыми.
+
+        Список заранее строит команда build_similar_recipes, ответ -
+        одно чтение по индексу таблицы SimilarRecipe.
+        """
+        try:
+            recipes = [
+                row.similar for row in SimilarRecipe.objects.filter(
+                    recipe=kwargs['pk']
+                ).select_related('similar').defer(
+                    'similar__search_vector'
+                ).order_by('-score')
+            ]
+        except ValueError:
+            raise Http404
+        # Пустой список бывает и у рецепта, для которого похожие
+        # ещё не посчитаны, поэтому только тогда проверяется рецепт.
+        if not recipes and not Recipe.objects.filter(
+            pk=kwargs['pk']
+        ).exists():
+            raise Http404('No Recipe matches the given query.')
+        return Response(self.get_serializer(recipes, many=True).data)
+
     def post_func(self, request, model):
         """Добавление рецепта в Избранное или в Список покупок."""
         serializer = self.get_serializer(
@@ -188,7 +383,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
             }
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save(user=request.user, recipe=self.get_object())
+        with transaction.atomic():
+            serializer.save(user=request.user, recipe=self.get_object())
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_func(self, request, model):
@@ -231,18 +427,53 @@ class RecipeViewSet(viewsets.ModelViewSet):
         detail=False,
         methods=['get', ],
         permission_classes=(permissions.IsAuthenticated,),
+        renderer_classes=(PlainTextRenderer, CSVRenderer, JSONRenderer),
     )
     def download_shopping_cart(self, request):
-        """Скачивание Списка покупок."""
-        indredients = IngredientRecipe.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount_sum=Sum('amount'))
-        shopping_cart = ''
-        for ingredient in indredients:
-            name = ingredient['ingredient__name']
-            measurement_unit = ingredient['ingredient__measurement_unit']
-            amount = ingredient['amount_sum']
-            shopping_cart += f'{name} ({measurement_unit}) - {amount}\n'
-        return HttpResponse(shopping_cart, content_type='text/plain')
+        """Скачивание Списка покупок.
+
+        Формат файла (txt, csv или json) выбирается параметром format
+        или заголовком Accept. Список читается из агрегированной таблицы
+        ShoppingListItem и отдаётся потоком по мере чтения строк курсора.
+        С заголовком Prefer: respond-async файл готовится фоновой задачей,
+        ссылка на него появится в результате задачи.
+        """
+        file_format = request.accepted_renderer.format
+        if prefers_async(request):
+            return accepted(request, enqueue(
+                'shopping_cart.export', user=request.user,
+                format=file_format
+            ))
+        response = StreamingHttpResponse(
+            SHOPPING_CART_WRITERS[file_format](shopping_list(request.user)),
+            content_type=(
+                f'{request.accepted_renderer.media_type}; charset=utf-8'
+            )
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{file_format}"'
+        )
+        return response
+
+
+class JobViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin,
+                 viewsets.GenericViewSet):
+    """Статусы фоновых задач текущего пользователя."""
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = CustomPagination
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
+
+
+class DatabasePoolView(APIView):
+    """Статистика пулов соединений с БД процесса, ответившего на запрос.
+
+    У каждого воркера gunicorn свои пулы, поэтому в ответе есть pid.
+    """
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response({'pid': os.getpid(), 'pools': pool_stats()})
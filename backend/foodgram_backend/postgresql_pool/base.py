@@ -0,0 +1,42 @@
+"""Бэкенд PostgreSQL, который берёт соединения из пула процесса.
+
+Django 4.2 открывает соединение на каждый запрос (CONN_MAX_AGE=0)
+и закрывает его в конце. Здесь закрытие возвращает соединение
+в пул, а открытие берёт свободное из пула, так что рабочий процесс
+держит не больше POOL['SIZE'] соединений и не тратит время на их
+установку. Параметры пула - ключ POOL в настройках БД.
+"""
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict.get('POOL', {}))
+
+    def connect_direct(self, conn_params):
+        """Новое соединение, как у обычного бэкенда."""
+        return super().get_new_connection(conn_params)
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        return self.pool.checkout(lambda: self.connect_direct(conn_params))
+
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.in_atomic_block:
+            # Django держит закрытое внутри atomic соединение до выхода
+            # из блока, поэтому другим потокам его отдавать нельзя.
+            self.pool.discard(self.connection)
+        else:
+            self.pool.checkin(self.connection)
+
+    def prewarm_pool(self):
+        conn_params = self.get_connection_params()
+        with self.wrap_database_errors:
+            self.pool.prewarm(lambda: self.connect_direct(conn_params))
@@ -0,0 +1,242 @@
+import os
+import time
+from collections import Counter, deque
+from threading import Condition, Lock
+
+import psycopg2
+from django.db import connections
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INERROR,
+    TRANSACTION_STATUS_INTRANS
+)
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Свободное соединение не появилось за TIMEOUT секунд."""
+
+
+class ConnectionPool:
+    """Соединения psycopg2 с одной БД, общие для потоков процесса.
+
+    Открыто не больше size соединений. Если все заняты, checkout()
+    ждёт освобождения до timeout секунд, ожидающие получают соединения
+    в порядке очереди. Свободные соединения выдаются в обратном порядке
+    (последнее вернувшееся - первым), так что редко нужные соединения
+    простаивают и отсеиваются проверкой.
+    """
+
+    def __init__(self, size, min_size=0, timeout=10, check_after=5):
+        self.size = size
+        self.min_size = min(min_size, size)
+        self.timeout = timeout
+        self.check_after = check_after
+        self.lock = Lock()
+        # Ожидающие соединения в порядке очереди, у каждого свой Condition.
+        self.waiters = deque()
+        # Пары (соединение, время возврата в пул).
+        self.idle = deque()
+        # Выданные соединения и открываемые для выдачи.
+        self.active = 0
+        self.counters = Counter()
+
+    def checkout(self, connect):
+        """Свободное соединение или новое из connect().
+
+        Соединение, простоявшее в пуле дольше check_after секунд,
+        перед выдачей проверяется запросом SELECT 1, неисправные
+        закрываются.
+        """
+        started = time.monotonic()
+        with self.lock:
+            self.counters['checkouts'] += 1
+            if self.waiters or not self.available():
+                self.counters['waits'] += 1
+                waiter = Condition(self.lock)
+                self.waiters.append(waiter)
+                try:
+                    ready = waiter.wait_for(
+                        lambda: (
+                            self.waiters[0] is waiter and self.available()
+                        ),
+                        self.timeout
+                    )
+                finally:
+                    self.waiters.remove(waiter)
+                    self.notify()
+                if not ready:
+                    self.counters['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'Все {self.size} соединений пула заняты '
+                        f'дольше {self.timeout} с.'
+                    )
+                self.counters['wait_time'] += time.monotonic() - started
+            self.active += 1
+            connection, returned_at = (
+                self.idle.pop() if self.idle else (None, None)
+            )
+        try:
+            while connection is not None:
+                if self.is_usable(connection, returned_at):
+                    return connection
+                self.close_connection(connection)
+                with self.lock:
+                    self.counters['discarded'] += 1
+                    connection, returned_at = (
+                        self.idle.pop() if self.idle else (None, None)
+                    )
+            connection = connect()
+        except BaseException:
+            self.release()
+            raise
+        with self.lock:
+            self.counters['opened'] += 1
+        return connection
+
+    def checkin(self, connection):
+        """Возвращает соединение в пул, откатив незавершённую транзакцию.
+
+        Неисправные соединения закрываются.
+        """
+        usable = not connection.closed
+        if usable:
+            status = connection.get_transaction_status()
+            if status in (
+                TRANSACTION_STATUS_INTRANS, TRANSACTION_STATUS_INERROR
+            ):
+                try:
+                    connection.rollback()
+                except psycopg2.Error:
+                    usable = False
+            elif status != TRANSACTION_STATUS_IDLE:
+                usable = False
+        if not usable:
+            self.discard(connection)
+            return
+        with self.lock:
+            self.active -= 1
+            self.idle.append((connection, time.monotonic()))
+            self.notify()
+
+    def discard(self, connection):
+        """Закрывает выданное соединение вместо возврата в пул."""
+        self.close_connection(connection)
+        with self.lock:
+            self.counters['discarded'] += 1
+        self.release()
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+            self.notify()
+
+    def available(self):
+        return bool(self.idle) or self.active < self.size
+
+    def notify(self):
+        """Будит первого в очереди; вызывается под self.lock."""
+        if self.waiters:
+            self.waiters[0].notify()
+
+    def is_usable(self, connection, returned_at):
+        if connection.closed:
+            return False
+        if time.monotonic() - returned_at < self.check_after:
+            return True
+        with self.lock:
+            self.counters['checks'] += 1
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    @staticmethod
+    def close_connection(connection):
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def prewarm(self, connect):
+        """Открывает соединения, пока в пуле их меньше min_size."""
+        while True:
+            with self.lock:
+                if self.active + len(self.idle) >= self.min_size:
+                    return
+                self.active += 1
+            try:
+                connection = connect()
+            except BaseException:
+                self.release()
+                raise
+            with self.lock:
+                self.counters['opened'] += 1
+            self.checkin(connection)
+
+    def close(self):
+        """Закрывает свободные соединения."""
+        with self.lock:
+            idle, self.idle = self.idle, deque()
+        for connection, _ in idle:
+            self.close_connection(connection)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': self.size,
+                'active': self.active,
+                'idle': len(self.idle),
+                'checkouts': self.counters['checkouts'],
+                'waits': self.counters['waits'],
+                'wait_time_ms': round(self.counters['wait_time'] * 1000, 1),
+                'timeouts': self.counters['timeouts'],
+                'opened': self.counters['opened'],
+                'discarded': self.counters['discarded'],
+                'checks': self.counters['checks'],
+            }
+
+
+# Пулы по (псевдониму БД, pid): после fork процесс заводит свои.
+pools = {}
+pools_lock = Lock()
+
+
+def get_pool(alias, options):
+    """Пул соединений БД alias в этом процессе.
+
+    options - ключ POOL настроек БД: SIZE, MIN_SIZE, TIMEOUT
+    и CHECK_AFTER.
+    """
+    key = (alias, os.getpid())
+    pool = pools.get(key)
+    if pool is None:
+        with pools_lock:
+            pool = pools.get(key)
+            if pool is None:
+                pool = pools[key] = ConnectionPool(
+                    size=options.get('SIZE', 4),
+                    min_size=options.get('MIN_SIZE', 1),
+                    timeout=options.get('TIMEOUT', 10),
+                    check_after=options.get('CHECK_AFTER', 5),
+                )
+    return pool
+
+
+def prewarm_pools():
+    """Открывает MIN_SIZE соединений для каждой БД с пулом."""
+    for connection in connections.all():
+        if hasattr(connection, 'prewarm_pool'):
+            connection.prewarm_pool()
+
+
+def pool_stats():
+    """Статистика пулов этого процесса по псевдонимам БД."""
+    pid = os.getpid()
+    return {
+        alias: pool.stats()
+        for (alias, pool_pid), pool in list(pools.items())
+        if pool_pid == pid
+    }
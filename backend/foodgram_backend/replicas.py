@@ -0,0 +1,146 @@
+"""Чтение с реплик БД и запись в основную.
+
+ReplicaMiddleware выбирает реплику для запросов GET, HEAD и OPTIONS,
+ReplicaRouter отправляет на неё чтения этого запроса. Всё остальное -
+записи, небезопасные запросы, команды, фоновые задачи - идёт
+в основную БД. После небезопасного запроса клиент REPLICA_STICKY_SECONDS
+секунд читает из основной БД, чтобы сразу видеть свои изменения, пока
+реплики их догоняют.
+"""
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Кука клиента, недавно изменявшего данные.
+STICKY_COOKIE = 'use_primary'
+
+# Реплика для чтений текущего запроса, None - основная БД.
+read_database = ContextVar('read_database', default=None)
+
+
+@contextmanager
+def read_from(alias):
+    """Читать внутри блока из БД alias, None - из основной."""
+    token = read_database.set(alias)
+    try:
+        yield
+    finally:
+        read_database.reset(token)
+
+
+def use_primary():
+    """Читать из основной БД внутри блока.
+
+    Для данных, которые запоминаются надолго, например справочников
+    в памяти процесса: отставшая реплика не должна попасть в кеш.
+    """
+    return read_from(None)
+
+
+class ReplicaRouter:
+    """Чтения запроса - с выбранной реплики, остальное - в основную БД."""
+
+    def db_for_read(self, model, **hints):
+        alias = read_database.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему от основной БД.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Выбирает БД для чтений запроса и запоминает пишущих клиентов.
+
+    Клиента узнают по куке STICKY_COOKIE и, для клиентов без кук,
+    по заголовку Authorization в кеше Django. Без общего кеша (Redis,
+    Memcached) второй способ работает только в пределах процесса.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def sticky_key(request):
+        authorization = request.headers.get('Authorization')
+        if not authorization:
+            return None
+        return 'use-primary-' + hashlib.sha256(
+            authorization.encode()
+        ).hexdigest()
+
+    @staticmethod
+    def is_read(request):
+        return (
+            settings.DATABASE_REPLICAS
+            and request.method in READ_METHODS
+            and STICKY_COOKIE not in request.COOKIES
+        )
+
+    @staticmethod
+    def is_write(request):
+        return (
+            settings.DATABASE_REPLICAS
+            and request.method not in READ_METHODS
+        )
+
+    @staticmethod
+    def choose_replica(read):
+        return random.choice(settings.DATABASE_REPLICAS) if read else None
+
+    @staticmethod
+    def stick(response):
+        """Направляет чтения клиента в основную БД на время окна."""
+        response.set_cookie(
+            STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+            httponly=True, samesite='Lax'
+        )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key = self.sticky_key(request)
+        read = self.is_read(request) and not (key and cache.get(key))
+        with read_from(self.choose_replica(read)):
+            response = self.get_response(request)
+        if self.is_write(request):
+            self.stick(response)
+            if key:
+                cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        key = self.sticky_key(request)
+        read = self.is_read(request) and not (key and await cache.aget(key))
+        with read_from(self.choose_replica(read)):
+            response = await self.get_response(request)
+        if self.is_write(request):
+            self.stick(response)
+            if key:
+                await cache.aset(key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
@@ -39,10 +39,12 @@ INSTALLED_APPS = [
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
     'api.apps.ApiConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram_backend.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -75,17 +77,53 @@ WSGI_APPLICATION = 'foodgram_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Пул соединений в каждом процессе (DB_POOL=True): соединения не
+# закрываются после запроса, а возвращаются в пул. SIZE - сколько
+# соединений держит процесс (не меньше числа его потоков, например
+# JOBS_CONCURRENCY + 1 для run_jobs), MIN_SIZE - сколько открыть при
+# старте воркера gunicorn, TIMEOUT - сколько секунд ждать свободного,
+# CHECK_AFTER - после скольких секунд простоя проверять соединение
+# запросом перед выдачей.
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': (
+            'foodgram_backend.postgresql_pool' if DB_POOL
+            else 'django.db.backends.postgresql'
+        ),
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'POOL': {
+            'SIZE': int(os.getenv('DB_POOL_SIZE', 4)),
+            'MIN_SIZE': int(os.getenv('DB_POOL_PREWARM', 1)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'CHECK_AFTER': float(os.getenv('DB_POOL_CHECK_AFTER', 5)),
+        },
     }
 }
 
+# Реплики только для чтения: хосты через запятую (host или host:port),
+# остальные параметры - как у основной БД. Запросы GET, HEAD и OPTIONS
+# читают со случайной реплики, клиент после изменения данных
+# REPLICA_STICKY_SECONDS секунд читает из основной БД.
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1
+):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['foodgram_backend.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
@@ -142,7 +180,7 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'SEARCH_PARAM': 'name',
 }
@@ -160,8 +198,85 @@ DJOSER = {
     'HIDE_USERS': False,
 }
 
+# Общий для всех процессов кеш Django (Redis): через него воркеры
+# gunicorn и worker узнают об отзыве токенов и изменении справочников.
+# Без REDIS_URL кеш живёт в памяти процесса, как при разработке.
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+# Кеш пользователей по токену в памяти процесса: число записей и
+# время жизни записи в секундах. Выход, удаление токена и изменение
+# пользователя отзывают записи сразу во всех процессах через общий
+# кеш, поэтому без REDIS_URL кеш токенов выключен (размер 0): иначе
+# другие процессы принимали бы отозванный токен до TOKEN_CACHE_TTL.
+TOKEN_CACHE_SIZE = int(
+    os.getenv('TOKEN_CACHE_SIZE', 10_000 if REDIS_URL else 0)
+)
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 60))
+
 CSV_FILES_DIR = os.path.join(BASE_DIR, 'data')
 
+# Максимальное время жизни индекса ингредиентов в памяти процесса
+# и число подсказок в ответе на поиск ингредиента по началу названия.
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 5 * 60))
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_SEARCH_MAX_LIMIT = 500
+
+# Максимальное время жизни списка тегов в памяти процесса.
+TAG_REGISTRY_TTL = int(os.getenv('TAG_REGISTRY_TTL', 5 * 60))
+
+# Обратный индекс ингредиентов для подбора рецептов по продуктам
+# (фильтр pantry ленты): максимальное время жизни в памяти процесса,
+# наибольшее число изменений рецептов, которые процесс применяет к нему
+# без полной перестройки, и наибольшее число подобранных рецептов.
+PANTRY_INDEX_TTL = int(os.getenv('PANTRY_INDEX_TTL', 5 * 60))
+PANTRY_INDEX_MAX_CHANGES = int(os.getenv('PANTRY_INDEX_MAX_CHANGES', 100))
+PANTRY_MAX_RESULTS = int(os.getenv('PANTRY_MAX_RESULTS', 1000))
+
+# Ключ перестановки id рецептов в короткие ссылки. После смены ключа
+# новые ссылки могут совпасть со старыми, поэтому его не меняют.
+SHORT_LINK_KEY = os.getenv('SHORT_LINK_KEY', 'foodgram-short-links')
+
+# Время хранения в кеше общей части ответов с рецептами, в секундах.
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60 * 60))
+
+# Фоновые задачи (команда run_jobs): число одновременно выполняемых
+# задач, пауза между проверками пустой очереди и повторами упавшей
+# задачи (удваивается с каждой попыткой), как часто воркер отмечает
+# выполняемые задачи, время без отметки, после которого задача
+# считается брошенной, и срок хранения завершённых задач.
+JOBS_CONCURRENCY = int(os.getenv('JOBS_CONCURRENCY', 2))
+JOBS_POLL_INTERVAL = 1
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', 3))
+JOBS_RETRY_DELAY = 10
+JOBS_HEARTBEAT_INTERVAL = 30
+JOBS_TIMEOUT = int(os.getenv('JOBS_TIMEOUT', 10 * 60))
+JOBS_KEEP_DAYS = 7
+
+# Периодические задачи: имя задачи и интервал между запусками в секундах.
+# Воркер ставит задачу в очередь, когда с прошлой постановки прошёл
+# интервал, а предыдущая уже выполнена.
+JOBS_PERIODIC = {
+    'recipes.popularity': int(os.getenv('POPULARITY_INTERVAL', 60 * 60)),
+}
+
+# Популярность рецептов (сортировка ленты ordering=popular): учитываются
+# добавления в избранное и корзину за POPULARITY_WINDOW_DAYS дней, вклад
+# добавления убывает вдвое за POPULARITY_HALF_LIFE_DAYS дней.
+POPULARITY_WINDOW_DAYS = int(os.getenv('POPULARITY_WINDOW_DAYS', 30))
+POPULARITY_HALF_LIFE_DAYS = float(os.getenv('POPULARITY_HALF_LIFE_DAYS', 7))
+
+# Асинхронные view для чтения ленты, рецептов, тегов, ингредиентов
+# и коротких ссылок. Включается в asgi.py: под WSGI каждый такой
+# запрос запускал бы отдельный цикл событий.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False') == 'True'
+
 CSRF_TRUSTED_ORIGINS = os.getenv('CSRF_TRUSTED_ORIGINS', '').split(';')
 
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
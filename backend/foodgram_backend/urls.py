@@ -3,13 +3,18 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
+from api import async_views
 from api.utils import recipe_redirection
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    path('s/<str:short_link>', recipe_redirection),
+    path(
+        's/<str:short_link>',
+        async_views.recipe_redirection
+        if settings.ASYNC_READ_VIEWS else recipe_redirection
+    ),
 ]
 
 
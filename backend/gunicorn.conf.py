@@ -0,0 +1,26 @@
+# Настройки gunicorn: файл подхватывается автоматически при запуске
+# из каталога backend.
+
+
+def post_worker_init(worker):
+    """Открывает соединения пула до первого запроса воркера."""
+    from django.conf import settings
+    from django.db import DatabaseError
+
+    if settings.DB_POOL:
+        from foodgram_backend.postgresql_pool.pool import prewarm_pools
+
+        try:
+            prewarm_pools()
+        except DatabaseError as error:
+            # Недоступная БД не должна мешать запуску: соединения
+            # откроются при первых запросах.
+            worker.log.warning('Пул соединений не прогрет: %s', error)
+
+
+def worker_exit(server, worker):
+    """Закрывает свободные соединения пула при остановке воркера."""
+    from foodgram_backend.postgresql_pool.pool import pools
+
+    for pool in pools.values():
+        pool.close()
@@ -0,0 +1,17 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'name', 'user', 'status', 'attempts', 'created_at', 'finished_at'
+    )
+    list_filter = ('status', 'name')
+    list_select_related = ('user',)
+    search_fields = ('name', 'user__username')
+    readonly_fields = (
+        'id', 'name', 'payload', 'user', 'attempts', 'result', 'error',
+        'created_at', 'started_at', 'heartbeat_at', 'finished_at'
+    )
@@ -0,0 +1,105 @@
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connection
+
+from jobs.runner import claim, heartbeat, recover, run, schedule
+
+# Как часто воркер возвращает в очередь зависшие задачи и ставит
+# периодические, в секундах.
+RECOVER_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из очереди в таблице Job. '
+        'Останавливается по SIGINT или SIGTERM, дождавшись текущих задач.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.JOBS_CONCURRENCY,
+            help='Сколько задач выполнять одновременно.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить задачи, которые уже в очереди, и завершиться.'
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency должно быть не меньше 1.')
+        self.stop = threading.Event()
+        self.once = options['once']
+        # Задачи, которые сейчас выполняют потоки воркера, по id.
+        self.running = {}
+        self.running_lock = threading.Lock()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: self.stop.set())
+        self.maintain()
+        self.stdout.write(
+            f'Воркер запущен, задач одновременно: {options["concurrency"]}.'
+        )
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            for _ in range(options['concurrency']):
+                executor.submit(self.work)
+            last_recover = last_heartbeat = time.monotonic()
+            while not self.stop.wait(1):
+                if (
+                    time.monotonic() - last_heartbeat
+                    > settings.JOBS_HEARTBEAT_INTERVAL
+                ):
+                    self.heartbeat()
+                    last_heartbeat = time.monotonic()
+                if time.monotonic() - last_recover > RECOVER_INTERVAL:
+                    self.maintain()
+                    last_recover = time.monotonic()
+        self.stdout.write(self.style.SUCCESS('Воркер остановлен.'))
+
+    def heartbeat(self):
+        """Отмечает выполняемые задачи, чтобы recover() их не вернул."""
+        with self.running_lock:
+            jobs = list(self.running.values())
+        try:
+            heartbeat(jobs)
+        except DatabaseError as error:
+            self.stderr.write(f'Отметка задач не записана: {error}')
+
+    def maintain(self):
+        """Возвращает в очередь зависшие задачи и ставит периодические."""
+        recover()
+        if not self.once:
+            schedule()
+
+    def work(self):
+        """Цикл одного потока: берёт задачи, пока не будет остановлен."""
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                try:
+                    job = claim()
+                except DatabaseError as error:
+                    self.stderr.write(f'Очередь недоступна: {error}')
+                    self.stop.wait(settings.JOBS_POLL_INTERVAL)
+                    continue
+                if job is None:
+                    if self.once:
+                        self.stop.set()
+                        break
+                    self.stop.wait(settings.JOBS_POLL_INTERVAL)
+                    continue
+                self.stdout.write(f'{job.name} ({job.pk}): начата.')
+                with self.running_lock:
+                    self.running[job.pk] = job
+                try:
+                    run(job)
+                finally:
+                    with self.running_lock:
+                        del self.running[job.pk]
+                self.stdout.write(f'{job.name} ({job.pk}): завершена.')
+        finally:
+            connection.close()
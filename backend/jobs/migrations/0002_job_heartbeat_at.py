@@ -0,0 +1,28 @@
+# Generated by Django 4.2.14 on 2026-10-18 05:06
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_heartbeats(apps, schema_editor):
+    """Выполняемым задачам - отметку по времени начала."""
+    Job = apps.get_model('jobs', 'Job')
+    Job.objects.filter(status='running').update(heartbeat_at=F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Отметка воркера'),
+        ),
+        migrations.RunPython(
+            backfill_heartbeats, migrations.RunPython.noop
+        ),
+    ]
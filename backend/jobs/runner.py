@@ -0,0 +1,177 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Обработчики задач по имени; заполняются декоратором task.
+TASKS = {}
+
+
+class JobError(Exception):
+    """Ошибка, после которой повторять задачу бессмысленно."""
+
+
+def task(name, max_attempts=None, clear_payload=False):
+    """Регистрирует функцию как обработчик задач с именем name.
+
+    Обработчик получает объект Job и возвращает результат, который
+    можно сохранить в JSON. Исключение, кроме JobError, приводит
+    к повтору задачи, пока не исчерпаны max_attempts попыток.
+    С clear_payload параметры задачи стираются, когда она выполнена
+    или окончательно упала, - для больших или личных данных.
+    """
+    def decorator(func):
+        func.max_attempts = max_attempts or settings.JOBS_MAX_ATTEMPTS
+        func.clear_payload = clear_payload
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, user=None, **payload):
+    if name not in TASKS:
+        raise ValueError(f'Неизвестная задача {name}.')
+    return Job.objects.create(
+        name=name, user=user, payload=payload,
+        max_attempts=TASKS[name].max_attempts
+    )
+
+
+def claim():
+    """Берёт в работу следующую задачу из очереди или возвращает None.
+
+    На PostgreSQL строки, уже выбранные другими воркерами, пропускаются
+    (SKIP LOCKED). Условие на статус в UPDATE не даёт двум воркерам
+    взять одну задачу там, где блокировок строк нет.
+    """
+    with transaction.atomic():
+        job = Job.objects.select_for_update(skip_locked=True).filter(
+            status=Job.QUEUED, run_after__lte=timezone.now()
+        ).order_by('run_after').first()
+        if job is None:
+            return None
+        now = timezone.now()
+        taken = Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, started_at=now, heartbeat_at=now,
+            attempts=F('attempts') + 1
+        )
+    if not taken:
+        return claim()
+    job.refresh_from_db()
+    return job
+
+
+def run(job):
+    """Выполняет задачу и записывает результат или планирует повтор.
+
+    Изменения в БД, сделанные упавшим обработчиком, откатываются.
+    """
+    handler = TASKS.get(job.name)
+    try:
+        if handler is None:
+            raise JobError(f'Неизвестная задача {job.name}.')
+        with transaction.atomic():
+            result = handler(job)
+    except JobError as error:
+        logger.warning('Задача %s (%s): %s', job.name, job.pk, error)
+        fail(job, error, retry=False)
+        return
+    except Exception as error:
+        logger.exception('Задача %s (%s) завершилась ошибкой.', job.name,
+                         job.pk)
+        fail(job, error)
+        return
+    finish(job, Job.DONE, result=result)
+
+
+def attempt(job):
+    """Строка задачи, пока она выполняется в попытке job.attempts.
+
+    Если задачу вернули в очередь и взяли снова, изменения
+    от прежней попытки её не затрагивают.
+    """
+    return Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, attempts=job.attempts
+    )
+
+
+def finish(job, status, **fields):
+    handler = TASKS.get(job.name)
+    if handler is not None and handler.clear_payload:
+        fields['payload'] = {}
+    attempt(job).update(status=status, finished_at=timezone.now(), **fields)
+
+
+def fail(job, error, retry=True):
+    if retry and job.attempts < job.max_attempts:
+        delay = settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+        attempt(job).update(
+            status=Job.QUEUED, error=str(error),
+            run_after=timezone.now() + timedelta(seconds=delay)
+        )
+        return
+    finish(job, Job.FAILED, error=str(error))
+
+
+def heartbeat(jobs):
+    """Отмечает, что воркер ещё выполняет задачи jobs."""
+    if not jobs:
+        return
+    attempts = Q()
+    for job in jobs:
+        attempts |= Q(pk=job.pk, attempts=job.attempts)
+    Job.objects.filter(attempts, status=Job.RUNNING).update(
+        heartbeat_at=timezone.now()
+    )
+
+
+def recover():
+    """Возвращает в очередь задачи, воркер которых, видимо, упал.
+
+    Задача считается брошенной, если воркер не отмечал её дольше
+    JOBS_TIMEOUT секунд: живой воркер отмечает выполняемые задачи
+    каждые JOBS_HEARTBEAT_INTERVAL секунд, сколько бы они ни шли.
+    Удаляет завершённые задачи старше JOBS_KEEP_DAYS дней вместе
+    с файлами, путь к которым задача вернула в result['file'].
+    """
+    now = timezone.now()
+    for job in Job.objects.filter(
+        status=Job.RUNNING,
+        heartbeat_at__lt=now - timedelta(seconds=settings.JOBS_TIMEOUT)
+    ):
+        fail(job, 'Превышено время выполнения.')
+    expired = Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED),
+        finished_at__lt=now - timedelta(days=settings.JOBS_KEEP_DAYS)
+    )
+    for result in expired.filter(result__has_key='file').values_list(
+        'result', flat=True
+    ):
+        default_storage.delete(result['file'])
+    expired.delete()
+
+
+def schedule():
+    """Ставит в очередь периодические задачи из JOBS_PERIODIC.
+
+    Задача ставится, если такой же нет в очереди или в работе и
+    последняя создана больше интервала назад. Воркеры, проверившие
+    расписание одновременно, могут поставить задачу дважды, поэтому
+    периодические задачи должны допускать повторный запуск.
+    """
+    now = timezone.now()
+    for name, interval in settings.JOBS_PERIODIC.items():
+        if not Job.objects.filter(
+            Q(status__in=(Job.QUEUED, Job.RUNNING))
+            | Q(created_at__gt=now - timedelta(seconds=interval)),
+            name=name
+        ).exists():
+            enqueue(name)
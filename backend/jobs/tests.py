@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.test import TestCase
+from django.utils import timezone
+
+from users.models import User
+from .models import Job
+from .runner import claim, enqueue, finish, heartbeat, recover, run
+
+
+class RecoverTests(TestCase):
+    """recover() возвращает в очередь только брошенные задачи."""
+
+    def setUp(self):
+        self.job = enqueue('shopping_cart.export', format='txt')
+        self.job = claim()
+        self.long_ago = timezone.now() - timedelta(
+            seconds=settings.JOBS_TIMEOUT + 1
+        )
+        Job.objects.filter(pk=self.job.pk).update(started_at=self.long_ago)
+
+    def test_keeps_long_job_with_fresh_heartbeat(self):
+        heartbeat([self.job])
+        recover()
+        self.assertEqual(
+            Job.objects.get(pk=self.job.pk).status, Job.RUNNING
+        )
+
+    def test_requeues_job_without_heartbeat(self):
+        Job.objects.filter(pk=self.job.pk).update(
+            heartbeat_at=self.long_ago
+        )
+        recover()
+        self.assertEqual(Job.objects.get(pk=self.job.pk).status, Job.QUEUED)
+
+    def test_previous_attempt_does_not_finish_job(self):
+        Job.objects.filter(pk=self.job.pk).update(
+            heartbeat_at=self.long_ago
+        )
+        recover()
+        Job.objects.filter(pk=self.job.pk).update(run_after=timezone.now())
+        claim()
+        finish(self.job, Job.DONE, result={})
+        job = Job.objects.get(pk=self.job.pk)
+        self.assertEqual((job.status, job.attempts), (Job.RUNNING, 2))
+
+
+class AvatarTaskTests(TestCase):
+    """Изображение аватара не хранится после выполнения задачи."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com',
+            first_name='user', last_name='user', password='password'
+        )
+
+    def test_payload_cleared_after_failure(self):
+        # base64 от b'not an image'.
+        enqueue(
+            'users.avatar', user=self.user,
+            avatar='data:image/png;base64,bm90IGFuIGltYWdl'
+        )
+        job = claim()
+        run(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.payload), (Job.FAILED, {}))
@@ -2,8 +2,9 @@ from django.contrib import admin
 
 from .models import (
     Favorite, Ingredient, IngredientRecipe,
-    Recipe, ShoppingCart, Tag, TagRecipe,
+    Recipe, ShoppingCart, ShoppingListItem, SimilarRecipe, Tag, TagRecipe,
 )
+from .signals import recipe_ingredients_changed
 
 
 @admin.register(Favorite)
@@ -18,21 +19,48 @@ class IngredientAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 
+class RecipeRelationAdmin(admin.ModelAdmin):
+    """Админка связей рецепта: после правки обновляет версию рецепта."""
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.recipes_changed({obj.recipe_id})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.recipes_changed({obj.recipe_id})
+
+    def delete_queryset(self, request, queryset):
+        recipes = set(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        self.recipes_changed(recipes)
+
+    def recipes_changed(self, recipes):
+        Recipe.objects.filter(pk__in=recipes).touch()
+
+
 @admin.register(IngredientRecipe)
-class IngredientRecipeAdmin(admin.ModelAdmin):
+class IngredientRecipeAdmin(RecipeRelationAdmin):
     list_display = ('recipe', 'ingredient', 'amount')
     search_fields = ('recipe__name', 'ingredient__name')
 
+    def recipes_changed(self, recipes):
+        super().recipes_changed(recipes)
+        ShoppingListItem.objects.rebuild_for_recipe(recipes)
+        recipe_ingredients_changed.send(
+            sender=IngredientRecipe, recipes=recipes
+        )
+
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'favorites')
+    list_display = (
+        'name', 'author', 'favorites_count', 'shopping_cart_count'
+    )
     search_fields = ('name', 'author__username',)
     list_filter = ('tags',)
-
-    @admin.display(description='Число добавлений в избранное')
-    def favorites(self, obj):
-        return obj.favorite.count()
+    readonly_fields = ('favorites_count', 'shopping_cart_count', 'popularity')
+    list_select_related = ('author',)
 
 
 @admin.register(ShoppingCart)
@@ -41,6 +69,19 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'recipe__name',)
 
 
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'amount')
+    search_fields = ('user__username', 'ingredient__name')
+
+
+@admin.register(SimilarRecipe)
+class SimilarRecipeAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'similar', 'score')
+    search_fields = ('recipe__name',)
+    list_select_related = ('recipe', 'similar')
+
+
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug')
@@ -48,6 +89,6 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(TagRecipe)
-class TagRecipeAdmin(admin.ModelAdmin):
+class TagRecipeAdmin(RecipeRelationAdmin):
     list_display = ('tag', 'recipe')
     search_fields = ('tag__name', 'recipe__name')
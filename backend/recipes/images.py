@@ -0,0 +1,104 @@
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Наибольшая сторона каждого варианта в пикселях. Изображения
+# уменьшаются с сохранением пропорций и никогда не увеличиваются.
+RECIPE_IMAGE_VARIANTS = {'thumbnail': 320, 'card': 640, 'full': 1280}
+AVATAR_VARIANTS = {'thumbnail': 64, 'full': 256}
+
+# Загруженные изображения больше этого числа пикселей отклоняются,
+# чтобы сжатый файл не разворачивался в гигабайты памяти.
+MAX_IMAGE_PIXELS = 40_000_000
+VARIANT_FORMAT = 'WEBP'
+VARIANT_EXTENSION = 'webp'
+VARIANT_QUALITY = 80
+
+
+def variant_name(name, variant):
+    stem = os.path.splitext(name)[0]
+    return f'{stem}_{variant}.{VARIANT_EXTENSION}'
+
+
+def make_variants(name, variants, storage=default_storage):
+    """Создаёт варианты изображения name и возвращает их пути.
+
+    Результат сохраняется в модели: source - исходный файл, остальные
+    ключи - пути вариантов в storage. Существующие файлы вариантов
+    перезаписываются, так что вызов можно повторять.
+    """
+    with storage.open(name) as file:
+        with Image.open(file) as image:
+            if image.width * image.height > MAX_IMAGE_PIXELS:
+                raise ValueError(f'{name}: изображение слишком большое.')
+            image = ImageOps.exif_transpose(image)
+            image = image.convert(
+                'RGBA' if 'A' in image.getbands() else 'RGB'
+            )
+    paths = {'source': name}
+    for variant, size in variants.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        buffer = BytesIO()
+        resized.save(buffer, VARIANT_FORMAT, quality=VARIANT_QUALITY)
+        path = variant_name(name, variant)
+        if storage.exists(path):
+            storage.delete(path)
+        paths[variant] = storage.save(path, ContentFile(buffer.getvalue()))
+    return paths
+
+
+def delete_variants(paths, storage=default_storage):
+    for variant, path in paths.items():
+        if variant != 'source':
+            storage.delete(path)
+
+
+def sync_variants(instance, field, variants_field, variants):
+    """Создаёт варианты для только что загруженного изображения объекта.
+
+    Вызывается из save() до записи в БД: новый файл сохраняется
+    в storage так же, как это сделал бы FileField.pre_save, чтобы
+    варианты записались в ту же строку. Изображения, загруженные
+    раньше, не читаются (ими занимается команда make_image_variants),
+    так что сохранения по другим причинам, например last_login при
+    входе, не зависят от файлов. Если файл убран, варианты удаляются.
+    Возвращает True, если значение variants_field изменилось.
+    """
+    image = getattr(instance, field)
+    current = getattr(instance, variants_field)
+    if image and not image._committed:
+        image.save(image.name, image.file, save=False)
+        paths = try_make_variants(image.name, variants)
+    elif not image and current:
+        paths = {}
+    else:
+        return False
+    if current:
+        try:
+            delete_variants(current)
+        except OSError as error:
+            logger.warning(
+                'Не удалось удалить варианты %s: %s', current, error
+            )
+    setattr(instance, variants_field, paths)
+    return True
+
+
+def try_make_variants(name, variants):
+    """make_variants, который не падает на плохом файле.
+
+    Если файл не читается или не является изображением, возвращает
+    пустые варианты: ответы API тогда ссылаются на исходный файл.
+    """
+    try:
+        return make_variants(name, variants)
+    except (OSError, ValueError, Image.DecompressionBombError) as error:
+        logger.warning('Варианты %s не созданы: %s', name, error)
+        return {}
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import Recipe, SimilarRecipe
+from recipes.similarity import build
+
+# Сколько строк SimilarRecipe записывать одним запросом.
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает похожие рецепты по избранному и корзинам '
+        'пользователей, ингредиентам и тегам и заменяет ими таблицу '
+        'SimilarRecipe.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help='Сколько похожих рецептов хранить для каждого рецепта.'
+        )
+        parser.add_argument(
+            '--weights', type=float, nargs=3, default=[0.6, 0.3, 0.1],
+            metavar=('USERS', 'INGREDIENTS', 'TAGS'),
+            help='Веса сходства по пользователям, ингредиентам и тегам.'
+        )
+        parser.add_argument(
+            '--block-size', type=int, default=500,
+            help='Сколько рецептов обрабатывать за раз; '
+                 'от него зависит потребление памяти.'
+        )
+        parser.add_argument(
+            '--max-ingredient-recipes', type=int, default=2000,
+            help='Ингредиенты, которые есть в большем числе рецептов, '
+                 'не учитываются при сравнении по ингредиентам.'
+        )
+
+    def handle(self, *args, **options):
+        if min(options['top'], options['block_size']) < 1:
+            raise CommandError('--top и --block-size должны быть больше 0.')
+        started = time.monotonic()
+        recipes, similar, scores = build(
+            options['top'], options['weights'], options['block_size'],
+            options['max_ingredient_recipes']
+        )
+        with transaction.atomic():
+            # Рецепты, удалённые во время расчёта, пропускаются.
+            existing = set(Recipe.objects.values_list('id', flat=True))
+            SimilarRecipe.objects.all().delete()
+            # bulk_create собирает все объекты в список, поэтому
+            # строки передаются ему порциями.
+            for start in range(0, len(scores), BATCH_SIZE):
+                end = start + BATCH_SIZE
+                SimilarRecipe.objects.bulk_create(
+                    SimilarRecipe(
+                        recipe_id=recipe, similar_id=other, score=score
+                    )
+                    for recipe, other, score in zip(
+                        recipes[start:end].tolist(),
+                        similar[start:end].tolist(),
+                        scores[start:end].tolist()
+                    )
+                    if recipe in existing and other in existing
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Рецептов с похожими: {len(set(recipes.tolist()))}, '
+            f'за {time.monotonic() - started:.1f} с.'
+        ))
@@ -0,0 +1,102 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from recipes.images import (
+    AVATAR_VARIANTS, RECIPE_IMAGE_VARIANTS, delete_variants, make_variants
+)
+from recipes.models import Recipe
+from users.models import User
+
+# Поле с файлом, поле с вариантами и размеры вариантов для моделей.
+IMAGES = {
+    Recipe: ('image', 'image_variants', RECIPE_IMAGE_VARIANTS),
+    User: ('avatar', 'avatar_variants', AVATAR_VARIANTS),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт уменьшенные копии фото рецептов и аватаров, загруженных '
+        'до появления вариантов, в нескольких процессах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов, по умолчанию - число ядер.'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать варианты и для уже обработанных изображений.'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers должно быть не меньше 1.')
+        # Один файл может принадлежать нескольким объектам, варианты
+        # для него создаются один раз.
+        jobs = {}
+        for model, (field, variants_field, _) in IMAGES.items():
+            for pk, name, current in model.objects.exclude(
+                **{field: ''}
+            ).values_list('pk', field, variants_field).iterator():
+                if options['force'] or current.get('source') != name:
+                    jobs.setdefault((model, name), []).append(pk)
+        if not jobs:
+            self.stdout.write(self.style.SUCCESS('Все варианты уже есть.'))
+            return
+        # Соединения с БД не должны наследоваться дочерними процессами.
+        connections.close_all()
+        done = failed = 0
+        with ProcessPoolExecutor(
+            max_workers=options['workers'], initializer=django.setup
+        ) as executor:
+            futures = {
+                executor.submit(
+                    make_variants, name, IMAGES[model][2]
+                ): (model, name)
+                for model, name in jobs
+            }
+            for future in as_completed(futures):
+                model, name = job = futures[future]
+                try:
+                    paths = future.result()
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                self.save(model, name, jobs[job], paths)
+                done += 1
+                self.stdout.write(f'Обработано {done} из {len(jobs)}.')
+        if failed:
+            raise CommandError(f'Не удалось обработать: {failed}.')
+        self.stdout.write(self.style.SUCCESS('Варианты созданы.'))
+
+    def save(self, model, name, pks, paths):
+        """Записывает варианты объектам, у которых файл не сменился.
+
+        Ответы API с изображением кешируются по updated_at рецепта,
+        поэтому рецепты с новыми вариантами помечаются изменёнными.
+        """
+        field, variants_field, _ = IMAGES[model]
+        rows = model.objects.filter(pk__in=pks, **{field: name})
+        stale = [
+            current for current in rows.values_list(
+                variants_field, flat=True
+            ) if current and current.get('source') != name
+        ]
+        changes = {variants_field: paths}
+        if model is Recipe:
+            changes['updated_at'] = timezone.now()
+        if not rows.update(**changes):
+            delete_variants(paths)
+            return
+        if model is User:
+            Recipe.objects.filter(author__in=rows).touch()
+        for current in stale:
+            delete_variants(current)
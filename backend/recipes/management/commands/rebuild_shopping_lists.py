@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingListItem
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает агрегированные списки покупок по корзинам '
+        'или проверяет (--verify), что они совпадают с корзинами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только сравнить таблицу с корзинами, не изменяя её.'
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if not options['verify']:
+            ShoppingListItem.objects.rebuild(users)
+            self.stdout.write(self.style.SUCCESS(
+                'Списки покупок пересчитаны: '
+                f'{ShoppingListItem.objects.count()} позиций.'
+            ))
+            return
+        expected = {
+            (row['user_id'], row['ingredient_id']): row['total']
+            for row in ShoppingListItem.objects.calculate(users).iterator()
+        }
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingListItem.objects.filter(amount__gt=0).values_list(
+                'user_id', 'ingredient_id', 'amount'
+            ).iterator()
+        }
+        mismatches = [
+            (key, stored.get(key), expected.get(key))
+            for key in expected.keys() | stored.keys()
+            if stored.get(key) != expected.get(key)
+        ]
+        for (user_id, ingredient_id), actual, correct in sorted(
+            mismatches, key=lambda mismatch: mismatch[0]
+        ):
+            self.stderr.write(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'в таблице {actual}, по корзине {correct}.'
+            )
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}.')
+        self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
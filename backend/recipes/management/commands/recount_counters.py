@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+# Модель со счётчиком, поле счётчика и что именно оно считает.
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'subscribed_to'),
+)
+
+
+def count_related(model, field):
+    """Подзапрос с числом объектов model, ссылающихся на строку."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики избранного, списков покупок, рецептов '
+        'и подписчиков или проверяет (--verify) их расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только найти расхождения, не изменяя счётчики.'
+        )
+
+    def handle(self, *args, **options):
+        mismatches = 0
+        with transaction.atomic():
+            for model, field, related, relation in COUNTERS:
+                drifted = model.objects.annotate(
+                    expected=count_related(related, relation)
+                ).exclude(**{field: F('expected')})
+                if options['verify']:
+                    for pk, actual, expected in drifted.values_list(
+                        'pk', field, 'expected'
+                    ).iterator():
+                        self.stderr.write(
+                            f'{model._meta.verbose_name} {pk}, {field}: '
+                            f'записано {actual}, на самом деле {expected}.'
+                        )
+                        mismatches += 1
+                    continue
+                fixed = model.objects.filter(
+                    pk__in=list(drifted.values_list('pk', flat=True))
+                ).update(**{field: count_related(related, relation)})
+                self.stdout.write(f'{field}: исправлено {fixed}.')
+        if not options['verify']:
+            self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
+            return
+        if mismatches:
+            raise CommandError(f'Расхождений: {mismatches}.')
+        self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
@@ -1,24 +1,15 @@
-import csv
-import os
-
-from django.core.management.base import BaseCommand
-
-from foodgram_backend.settings import CSV_FILES_DIR
+from api.registry import tag_registry
+from recipes.management.loader import LoadCommand
 from recipes.models import Tag
 
 
-class Command(BaseCommand):
-    help = 'Загружает данные из файла tags.csv в БД'
+class Command(LoadCommand):
+    help = 'Загружает теги из файла tags.csv или .json в БД'
+
+    model = Tag
+    fields = ('name', 'slug')
+    default_file = 'tags.csv'
 
-    def handle(self, *args, **options):
-        csv_file = 'tags.csv'
-        csv_path = os.path.join(CSV_FILES_DIR, 'tags.csv')
-        fieldnames = ['name', 'slug']
-        try:
-            with open(csv_path, encoding='utf-8') as f:
-                reader = csv.DictReader(f, fieldnames)
-                for row in reader:
-                    Tag(**row).save()
-            print(f'Данные из файла {csv_file} успешно загружены.')
-        except FileNotFoundError:
-            print(f'Файл {csv_file} не найден.')
+    def loaded(self):
+        # bulk_create и COPY не отправляют сигналы post_save.
+        tag_registry.invalidate()
@@ -0,0 +1,184 @@
+import csv
+import io
+import json
+import os
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from foodgram_backend.settings import CSV_FILES_DIR
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """Читает JSON-массив объектов по частям, не загружая файл целиком.
+
+    Разобранные объекты не вырезаются из буфера по одному: разбор идёт
+    со смещения pos, а прочитанное начало буфера отбрасывается один раз
+    перед добавлением следующей части файла.
+    """
+    decoder = json.JSONDecoder()
+    skip_whitespace = json.decoder.WHITESPACE.match
+    buffer = ''
+    pos = 0
+    started = finished = False
+    for chunk in iter(lambda: file.read(chunk_size), ''):
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        while not finished:
+            pos = skip_whitespace(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError('Ожидался JSON-массив.')
+                pos, started = pos + 1, True
+                continue
+            if buffer[pos] == ',':
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                finished = True
+                break
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Объект не поместился в прочитанную часть файла.
+                break
+            yield obj
+    if not finished:
+        raise ValueError('Некорректный JSON-массив.')
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class LoadCommand(BaseCommand):
+    """Базовая команда загрузки справочника из CSV или JSON.
+
+    Строки читаются потоком и вставляются пачками в одной транзакции.
+    Уже существующие записи (по уникальным полям модели) пропускаются,
+    поэтому команду можно запускать повторно. На PostgreSQL пачки
+    загружаются через COPY во временную таблицу и переносятся в
+    таблицу модели запросом INSERT ... ON CONFLICT DO NOTHING.
+    """
+
+    model = None
+    fields = ()
+    default_file = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=None,
+            help=f'CSV или JSON файл, по умолчанию {self.default_file} '
+                 'из папки data.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY даже на PostgreSQL.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path'] or os.path.join(
+            CSV_FILES_DIR, self.default_file
+        )
+        file_name = os.path.basename(path)
+        use_copy = (
+            connection.vendor == 'postgresql' and not options['no_copy']
+        )
+        try:
+            with open(path, encoding='utf-8', newline='') as file:
+                with transaction.atomic():
+                    before = self.model.objects.count()
+                    total = 0
+                    load = self.copy_batch if use_copy else self.insert_batch
+                    if use_copy:
+                        self.create_temp_table()
+                    for batch in batched(
+                        self.read(file, path), options['batch_size']
+                    ):
+                        load(batch)
+                        total += len(batch)
+                        self.stdout.write(f'Обработано строк: {total}')
+                    if use_copy:
+                        self.move_temp_table()
+                    created = self.model.objects.count() - before
+                    transaction.on_commit(self.loaded)
+        except FileNotFoundError:
+            raise CommandError(f'Файл {file_name} не найден.')
+        except (ValueError, KeyError, csv.Error) as error:
+            raise CommandError(f'Ошибка в файле {file_name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные из файла {file_name} успешно загружены: '
+            f'добавлено {created}, пропущено {total - created}.'
+        ))
+
+    def read(self, file, path):
+        """Строки файла в виде кортежей значений полей self.fields."""
+        if path.endswith('.json'):
+            rows = (
+                tuple(str(obj[field]) for field in self.fields)
+                for obj in iter_json_array(file)
+            )
+        else:
+            rows = csv.reader(file)
+        for row in rows:
+            if not row:
+                continue
+            if len(row) != len(self.fields):
+                raise ValueError(f'неверное число полей в строке {row}')
+            yield tuple(value.strip() for value in row)
+
+    def insert_batch(self, batch):
+        self.model.objects.bulk_create(
+            (self.model(**dict(zip(self.fields, row))) for row in batch),
+            ignore_conflicts=True,
+        )
+
+    @property
+    def temp_table(self):
+        return connection.ops.quote_name(f'load_{self.model._meta.db_table}')
+
+    @property
+    def columns(self):
+        return ', '.join(
+            connection.ops.quote_name(self.model._meta.get_field(field).column)
+            for field in self.fields
+        )
+
+    def create_temp_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {self.temp_table} ON COMMIT DROP AS '
+                f'SELECT {self.columns} '
+                f'FROM {connection.ops.quote_name(self.model._meta.db_table)} '
+                'WITH NO DATA'
+            )
+
+    def copy_batch(self, batch):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {self.temp_table} ({self.columns}) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+
+    def move_temp_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO '
+                f'{connection.ops.quote_name(self.model._meta.db_table)} '
+                f'({self.columns}) '
+                f'SELECT DISTINCT {self.columns} FROM {self.temp_table} '
+                'ON CONFLICT DO NOTHING'
+            )
+
+    def loaded(self):
+        """Вызывается после успешной загрузки данных."""
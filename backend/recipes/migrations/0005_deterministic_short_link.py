@@ -0,0 +1,90 @@
+# Generated by Django 4.2.14 on 2026-10-18 03:32
+
+import hmac
+import random
+from hashlib import sha256
+from string import ascii_letters, digits
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Копия recipes.utils.get_short_link на момент миграции: ссылки,
+# заполненные ею, должны совпадать с вычисляемыми приложением, даже
+# если recipes.utils потом изменится.
+ALPHABET = digits + ascii_letters
+SHORT_LINK_LENGTH = 5
+SHORT_LINK_SPACE = len(ALPHABET) ** SHORT_LINK_LENGTH
+HALF_BITS = (SHORT_LINK_SPACE.bit_length() + 1) // 2
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+
+
+def feistel(value):
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for index in range(ROUNDS):
+        digest = hmac.new(
+            settings.SHORT_LINK_KEY.encode(),
+            f'{index}:{right}'.encode(),
+            sha256
+        ).digest()
+        left, right = right, left ^ (
+            int.from_bytes(digest[:4], 'big') & HALF_MASK
+        )
+    return (right << HALF_BITS) | left
+
+
+def get_short_link(recipe_id):
+    value = feistel(recipe_id)
+    while value >= SHORT_LINK_SPACE:
+        value = feistel(value)
+    chars = []
+    for _ in range(SHORT_LINK_LENGTH):
+        value, remainder = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
+
+def backfill_short_links(apps, schema_editor):
+    """Заполняет пустые короткие ссылки вычисляемыми по id.
+
+    Выданные раньше случайные ссылки остаются: ими уже могли
+    поделиться. Если вычисленная ссылка занята одной из них, рецепт
+    получает случайную свободную.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.filter(short_link='').update(short_link=None)
+    taken = set(Recipe.objects.exclude(short_link=None).values_list(
+        'short_link', flat=True
+    ))
+    recipes = []
+    for recipe in Recipe.objects.filter(
+        short_link=None
+    ).only('id').iterator():
+        link = get_short_link(recipe.id)
+        while link in taken:
+            link = ''.join(random.choices(ALPHABET, k=SHORT_LINK_LENGTH))
+        taken.add(link)
+        recipe.short_link = link
+        recipes.append(recipe)
+        if len(recipes) == 1000:
+            Recipe.objects.bulk_update(recipes, ['short_link'])
+            recipes = []
+    Recipe.objects.bulk_update(recipes, ['short_link'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='short_link',
+            field=models.CharField(blank=True, max_length=5, null=True, unique=True, verbose_name='Короткая ссылка'),
+        ),
+        migrations.RunPython(
+            backfill_short_links, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.14 on 2026-10-18 03:34
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Сливает дубли ингредиентов, созданные повторной загрузкой данных.
+
+    Ссылки из рецептов переводятся на ингредиент с наименьшим id,
+    списки покупок затронутых пользователей пересчитываются.
+    """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    groups = Ingredient.objects.values('name', 'measurement_unit').annotate(
+        keep=Min('id'), total=Count('id')
+    ).filter(total__gt=1).order_by()
+    users = set()
+    for group in list(groups):
+        duplicates = list(Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=group['keep']).values_list('id', flat=True))
+        for duplicate in duplicates:
+            rows = IngredientRecipe.objects.filter(ingredient_id=duplicate)
+            rows.filter(
+                recipe__in=IngredientRecipe.objects.filter(
+                    ingredient_id=group['keep']
+                ).values('recipe')
+            ).delete()
+            rows.update(ingredient_id=group['keep'])
+        users.update(ShoppingListItem.objects.filter(
+            ingredient_id__in=duplicates
+        ).values_list('user_id', flat=True))
+        Ingredient.objects.filter(id__in=duplicates).delete()
+    if not users:
+        return
+    ShoppingListItem.objects.filter(user_id__in=users).delete()
+    rows = IngredientRecipe.objects.filter(
+        recipe__shopping_cart__user_id__in=users
+    ).values(
+        'ingredient_id', user_id=F('recipe__shopping_cart__user_id')
+    ).annotate(total=Sum('amount')).order_by()
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=row['user_id'],
+                ingredient_id=row['ingredient_id'],
+                amount=row['total'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_deterministic_short_link'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.14 on 2026-10-18 04:03
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+from recipes.operations import AddIndexConcurrently
+
+# Название весит больше описания: веса A и B для ts_rank.
+CREATE_TRIGGER = """
+CREATE FUNCTION recipe_search_vector(name text, body text)
+RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+    SELECT setweight(to_tsvector('pg_catalog.russian', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('pg_catalog.russian', coalesce(body, '')), 'B')
+$$;
+
+CREATE FUNCTION recipes_recipe_search_vector_update()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := recipe_search_vector(NEW.name, NEW.text);
+    RETURN NEW;
+END
+$$;
+
+CREATE TRIGGER recipes_recipe_search_vector_update
+BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector_update();
+
+UPDATE recipes_recipe SET search_vector = recipe_search_vector(name, text);
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER recipes_recipe_search_vector_update ON recipes_recipe;
+DROP FUNCTION recipes_recipe_search_vector_update();
+DROP FUNCTION recipe_search_vector(text, text);
+"""
+
+
+def run_on_postgresql(sql):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0009_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(
+            run_on_postgresql(CREATE_TRIGGER),
+            run_on_postgresql(DROP_TRIGGER),
+        ),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.14 on 2026-10-18 04:31
+
+from django.db import migrations, models
+
+from recipes.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0011_similarrecipe'),
+    ]
+
+    operations = [
+        # Поле добавляется без auto_now_add: иначе Django заполнил бы
+        # существующие строки временем миграции, и вся прошлая
+        # активность выглядела бы свежей. Старые строки остаются NULL.
+        migrations.AddField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(null=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, null=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        # Поле добавляется без auto_now_add: иначе Django заполнил бы
+        # существующие строки временем миграции, и вся прошлая
+        # активность выглядела бы свежей. Старые строки остаются NULL.
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(null=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, null=True, verbose_name='Дата добавления'),
+        ),
+        AddIndexConcurrently(
+            model_name='favorite',
+            index=models.Index(fields=['created_at'], name='favorite_created_at_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity', '-pub_date', '-id'], name='recipe_popularity_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='shoppingcart',
+            index=models.Index(fields=['created_at'], name='shoppingcart_created_at_idx'),
+        ),
+    ]
@@ -1,7 +1,15 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Exists, F, Sum, Value, When
+from django.utils import timezone
 
 from users.models import User
+from .images import RECIPE_IMAGE_VARIANTS, sync_variants
+from .utils import (
+    SHORT_LINK_LENGTH, fields_except, get_random_short_link, get_short_link
+)
 
 
 class Ingredient(models.Model):
@@ -16,6 +24,12 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -44,6 +58,13 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def touch(self):
+        """Обновляет updated_at - версию рецептов для кеша ответов API."""
+        return self.update(updated_at=timezone.now())
+
+
 class Recipe(models.Model):
     """Модель рецепта."""
     author = models.ForeignKey(
@@ -58,6 +79,12 @@ class Recipe(models.Model):
         upload_to='images/recipes/',
         blank=False
     )
+    image_variants = models.JSONField(
+        'Варианты фото',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     text = models.TextField('Описание рецепта', blank=False)
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -78,8 +105,9 @@ class Recipe(models.Model):
     )
     short_link = models.CharField(
         'Короткая ссылка',
-        max_length=5,
+        max_length=SHORT_LINK_LENGTH,
         unique=True,
+        null=True,
         blank=True
     )
 
@@ -87,15 +115,99 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    favorites_count = models.IntegerField(
+        'Число добавлений в избранное',
+        default=0,
+        editable=False
+    )
+    shopping_cart_count = models.IntegerField(
+        'Число добавлений в список покупок',
+        default=0,
+        editable=False
+    )
+    # Пересчитывается периодической задачей recipes.popularity.
+    popularity = models.FloatField(
+        'Популярность',
+        default=0,
+        editable=False
+    )
+    # На PostgreSQL заполняется триггером из name и text
+    # (миграция 0010), на других БД не используется.
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    # Меняются только запросами UPDATE (счётчики - через F(),
+    # популярность - задачей), сохранение объекта их не записывает.
+    COUNTER_FIELDS = {'favorites_count', 'shopping_cart_count', 'popularity'}
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
+        # Под ленту рецептов (в том числе курсорную), фильтр по автору
+        # и сортировку по популярности.
+        # Фильтры по тегам, избранному и корзине используют индексы
+        # уникальных ограничений TagRecipe, Favorite и ShoppingCart.
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-popularity', '-pub_date', '-id'],
+                name='recipe_popularity_idx'
+            ),
+            GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = fields_except(
+                self, self.COUNTER_FIELDS
+            )
+        if sync_variants(
+            self, 'image', 'image_variants', RECIPE_IMAGE_VARIANTS
+        ) and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {
+                *kwargs['update_fields'], 'image_variants'
+            }
+        super().save(*args, **kwargs)
+        if not self.short_link:
+            self.set_short_link()
+
+    def set_short_link(self):
+        """Записывает рецепту короткую ссылку, вычисленную по id.
+
+        Если её уже занимает случайная ссылка, выданная до миграции
+        0005, рецепт получает случайную свободную ссылку. Проверка
+        занятости входит в тот же UPDATE.
+        """
+        link = get_short_link(self.pk)
+        free = ~Exists(Recipe.objects.filter(short_link=link))
+        if not Recipe.objects.filter(free, pk=self.pk).update(
+            short_link=link
+        ):
+            link = get_random_short_link()
+            while Recipe.objects.filter(short_link=link).exists():
+                link = get_random_short_link()
+            Recipe.objects.filter(pk=self.pk).update(short_link=link)
+        self.short_link = link
+
 
 class IngredientRecipe(models.Model):
     """Промежуточная модель для Ingredient и Recipe."""
@@ -166,6 +278,11 @@ class ShoppingCart(models.Model):
         related_name='shopping_cart',
         verbose_name='Рецепт'
     )
+    # У записей, созданных до появления поля, даты нет: они не считаются
+    # недавними при расчёте популярности.
+    created_at = models.DateTimeField(
+        'Дата добавления', auto_now_add=True, null=True
+    )
 
     class Meta:
         verbose_name = 'список покупок'
@@ -176,6 +293,12 @@ class ShoppingCart(models.Model):
                 name='unique_shoppingcart'
             )
         ]
+        # Под выборку недавних добавлений для популярности рецептов.
+        indexes = [
+            models.Index(
+                fields=['created_at'], name='shoppingcart_created_at_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'Рецепт: {self.recipe} в корзине у {self.user}'
@@ -194,6 +317,11 @@ class Favorite(models.Model):
         related_name='favorite',
         verbose_name='Рецепт'
     )
+    # У записей, созданных до появления поля, даты нет: они не считаются
+    # недавними при расчёте популярности.
+    created_at = models.DateTimeField(
+        'Дата добавления', auto_now_add=True, null=True
+    )
 
     class Meta:
         verbose_name = 'избранное'
@@ -204,6 +332,187 @@ class Favorite(models.Model):
                 name='unique_favorite'
             )
         ]
+        # Под выборку недавних добавлений для популярности рецептов.
+        indexes = [
+            models.Index(
+                fields=['created_at'], name='favorite_created_at_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'Рецепт: {self.recipe} в избранном у {self.user}'
+
+
+class ShoppingListManager(models.Manager):
+    """Поддерживает агрегированные списки покупок в актуальном состоянии."""
+
+    def calculate(self, users):
+        """Суммы ингредиентов из рецептов в корзинах пользователей users."""
+        return IngredientRecipe.objects.filter(
+            recipe__shopping_cart__user__in=users
+        ).values(
+            'ingredient_id', user_id=F('recipe__shopping_cart__user_id')
+        ).annotate(total=Sum('amount')).order_by()
+
+    @transaction.atomic
+    def rebuild(self, users):
+        """Пересчитывает списки покупок пользователей users целиком."""
+        self.filter(user__in=users).delete()
+        self.bulk_create((
+            self.model(
+                user_id=row['user_id'],
+                ingredient_id=row['ingredient_id'],
+                amount=row['total'],
+            )
+            for row in self.calculate(users).iterator()
+        ), batch_size=1000)
+
+    def rebuild_for_recipe(self, recipes):
+        """Пересчёт после изменения ингредиентов рецептов в корзинах.
+
+        recipes - рецепт, его id или коллекция id рецептов.
+        """
+        if not isinstance(recipes, (list, set, tuple)):
+            recipes = [recipes]
+        self.rebuild(User.objects.filter(shoppingcart__recipe__in=recipes))
+
+    @transaction.atomic
+    def change(self, users, deltas):
+        """Прибавляет к спискам покупок пользователей users количества
+        deltas ({id ингредиента: количество}, отрицательные вычитаются).
+
+        Строки пользователей блокируются, поэтому одновременные
+        изменения одного списка выполняются по очереди. Недостающие
+        позиции вставляются с нулём без ошибки при конфликте, затем
+        все меняются одним UPDATE с F(); позиции с количеством не
+        больше нуля удаляются.
+        """
+        deltas = {
+            ingredient_id: delta
+            for ingredient_id, delta in deltas.items() if delta
+        }
+        if not deltas:
+            return
+        users = list(
+            User.objects.select_for_update().filter(pk__in=users)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        if not users:
+            return
+        self.bulk_create(
+            (
+                self.model(user_id=user_id, ingredient_id=ingredient_id,
+                           amount=0)
+                for user_id in users
+                for ingredient_id, delta in deltas.items() if delta > 0
+            ),
+            batch_size=1000, ignore_conflicts=True
+        )
+        items = self.filter(user_id__in=users, ingredient_id__in=deltas)
+        items.update(amount=F('amount') + Case(
+            *(
+                When(ingredient_id=ingredient_id, then=Value(delta))
+                for ingredient_id, delta in deltas.items()
+            ),
+            default=Value(0),
+        ))
+        items.filter(amount__lte=0).delete()
+
+    def add_recipe(self, user_id, recipe_id, sign=1):
+        """Прибавляет (sign=1) или вычитает (sign=-1) ингредиенты рецепта."""
+        self.change([user_id], {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in IngredientRecipe.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('ingredient_id', 'amount')
+        })
+
+    def change_recipe(self, recipe, old, new):
+        """Учитывает замену ингредиентов рецепта old на new.
+
+        old и new - {id ингредиента: количество}; меняются только
+        списки пользователей с рецептом в корзине и только на разницу.
+        """
+        deltas = {
+            ingredient_id: new.get(ingredient_id, 0)
+            - old.get(ingredient_id, 0)
+            for ingredient_id in old.keys() | new.keys()
+        }
+        self.change(
+            ShoppingCart.objects.filter(recipe=recipe).values('user_id'),
+            deltas
+        )
+
+
+class ShoppingListItem(models.Model):
+    """Агрегированный список покупок пользователя.
+
+    Хранит суммарное количество каждого ингредиента из рецептов
+    в корзине пользователя и обновляется вместе с ShoppingCart.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField('Количество')
+
+    objects = ShoppingListManager()
+
+    class Meta:
+        verbose_name = 'позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shoppinglistitem'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.amount} у {self.user}'
+
+
+class SimilarRecipe(models.Model):
+    """Похожий рецепт для блока "вам может понравиться".
+
+    Таблицу целиком пересчитывает команда build_similar_recipes:
+    для каждого рецепта хранятся несколько самых похожих с оценкой.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField('Оценка сходства')
+
+    class Meta:
+        verbose_name = 'похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similarrecipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'], name='similar_recipe_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}'
@@ -0,0 +1,44 @@
+from django.contrib.postgres.indexes import PostgresIndex
+from django.db import migrations
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """AddIndex, который на PostgreSQL строит индекс CONCURRENTLY.
+
+    Такой индекс создаётся без блокировки записи в таблицу. Миграция
+    с этой операцией должна быть объявлена с atomic = False. На других
+    БД индекс создаётся обычным образом, а индексы PostgreSQL (GIN и
+    другие) пропускаются.
+    """
+
+    atomic = False
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            if isinstance(self.index, PostgresIndex):
+                return
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            if isinstance(self.index, PostgresIndex):
+                return
+            return super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+    def describe(self):
+        return (
+            f'Concurrently create index {self.index.name} on field(s) '
+            f'{", ".join(self.index.fields)} of model {self.model_name}'
+        )
@@ -0,0 +1,59 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Favorite, Recipe, ShoppingCart
+
+# Вклад одного добавления рецепта в популярность.
+POPULARITY_WEIGHTS = (
+    (Favorite, 1),
+    (ShoppingCart, 0.5),
+)
+BATCH_SIZE = 1000
+
+
+def calculate_popularity(now):
+    """Популярность рецептов по добавлениям за POPULARITY_WINDOW_DAYS дней.
+
+    Вклад добавления убывает вдвое каждые POPULARITY_HALF_LIFE_DAYS
+    дней. Добавления группируются по часам в БД, так что число строк
+    не зависит от числа пользователей. Добавления без даты (сделанные
+    до появления created_at) в окно не попадают.
+    """
+    half_life = timedelta(days=settings.POPULARITY_HALF_LIFE_DAYS)
+    scores = defaultdict(float)
+    for model, weight in POPULARITY_WEIGHTS:
+        for recipe_id, hour, count in model.objects.filter(
+            created_at__gt=now - timedelta(
+                days=settings.POPULARITY_WINDOW_DAYS
+            )
+        ).annotate(hour=TruncHour('created_at')).values(
+            'recipe_id', 'hour'
+        ).annotate(count=Count('pk')).order_by().values_list(
+            'recipe_id', 'hour', 'count'
+        ).iterator():
+            scores[recipe_id] += weight * count * 0.5 ** (
+                (now - hour) / half_life
+            )
+    return scores
+
+
+def update_popularity():
+    """Пересчитывает Recipe.popularity, возвращает число рецептов с ней."""
+    scores = calculate_popularity(timezone.now())
+    with transaction.atomic():
+        Recipe.objects.filter(popularity__gt=0).update(popularity=0)
+        Recipe.objects.bulk_update(
+            (
+                Recipe(pk=recipe_id, popularity=score)
+                for recipe_id, score in scores.items()
+            ),
+            ['popularity'],
+            batch_size=BATCH_SIZE
+        )
+    return len(scores)
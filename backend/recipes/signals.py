@@ -0,0 +1,127 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from users.models import Subscription, User
+from .models import (
+    Favorite, Ingredient, Recipe, ShoppingCart, ShoppingListItem, Tag
+)
+
+# Изменился состав ингредиентов рецептов (аргумент recipes - их id).
+# Связи пишутся через bulk_create без сигналов моделей, поэтому его
+# отправляют RecipeCreateSerializer и админка IngredientRecipe.
+recipe_ingredients_changed = Signal()
+
+# Поля пользователя, которые не попадают в ответы API.
+USER_PRIVATE_FIELDS = {'last_login', 'password'}
+
+# Связи рецепта с тегами и ингредиентами пишутся через bulk_create и
+# удаляются queryset'ом без сигналов. Версию рецепта при этом обновляет
+# сохранение самого рецепта в RecipeCreateSerializer, а в админке -
+# RecipeRelationAdmin.
+
+
+@receiver(post_save, sender=Tag)
+def tag_changed(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(tags=instance).touch()
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(ingredients=instance).touch()
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or (
+        update_fields and set(update_fields) <= USER_PRIVATE_FIELDS
+    ):
+        return
+    Recipe.objects.filter(author=instance).touch()
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(sender, instance, created, **kwargs):
+    if created:
+        ShoppingListItem.objects.add_recipe(
+            instance.user_id, instance.recipe_id
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_removed(sender, instance, origin=None, **kwargs):
+    # pre_delete отправляется до удаления ингредиентов рецепта, так что
+    # при каскадном удалении рецепта вычесть их ещё можно. Список покупок
+    # удаляемого пользователя удалится каскадно.
+    if isinstance(origin, User) and origin.pk == instance.user_id:
+        return
+    ShoppingListItem.objects.add_recipe(
+        instance.user_id, instance.recipe_id, sign=-1
+    )
+
+
+# Счётчики рецептов и пользователей меняются запросом UPDATE с F(),
+# поэтому одновременные запросы не теряют изменения друг друга.
+# Удаление (вместе с сигналами) Django выполняет в транзакции, создание
+# обёрнуто в transaction.atomic во вьюсетах. При каскадном удалении
+# объекта со счётчиком сам счётчик уже не обновляется.
+
+
+def change_counter(model, pk, field, delta):
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def is_origin(origin, model, pk):
+    return isinstance(origin, model) and origin.pk == pk
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_removed(sender, instance, origin=None, **kwargs):
+    if not is_origin(origin, Recipe, instance.recipe_id):
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_counted(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'shopping_cart_count', 1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_uncounted(sender, instance, origin=None, **kwargs):
+    if not is_origin(origin, Recipe, instance.recipe_id):
+        change_counter(Recipe, instance.recipe_id, 'shopping_cart_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_removed(sender, instance, origin=None, **kwargs):
+    if not is_origin(origin, User, instance.author_id):
+        change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.subscribed_to_id, 'subscribers_count', 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_removed(sender, instance, origin=None, **kwargs):
+    if not is_origin(origin, User, instance.subscribed_to_id):
+        change_counter(
+            User, instance.subscribed_to_id, 'subscribers_count', -1
+        )
@@ -0,0 +1,140 @@
+"""Расчёт похожих рецептов для команды build_similar_recipes.
+
+Матрицы строятся из таблиц по потоку строк, без объектов моделей,
+и хранятся в разреженном виде. Сходство считается блоками столбцов,
+так что память зависит от числа оценок и размера блока, а не от
+квадрата числа рецептов.
+"""
+import numpy as np
+from scipy import sparse
+
+from .models import (
+    Favorite, IngredientRecipe, Recipe, ShoppingCart, TagRecipe
+)
+
+# Вес рецепта в корзине относительно рецепта в избранном.
+SHOPPING_CART_WEIGHT = 0.5
+
+
+def fetch_pairs(queryset, fields):
+    """Два столбца queryset в виде массивов numpy."""
+    rows = queryset.values_list(*fields).order_by()
+    pairs = np.fromiter(
+        rows.iterator(chunk_size=10_000),
+        dtype=[('a', np.int64), ('b', np.int64)],
+        count=rows.count()
+    )
+    return pairs['a'], pairs['b']
+
+
+def normalize_columns(matrix):
+    """Делит столбцы матрицы на их длину, пустые столбцы остаются нулями."""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0))).ravel()
+    norms[norms == 0] = 1
+    return (matrix @ sparse.diags(1 / norms)).astype(np.float32)
+
+
+def interaction_matrix(recipe_ids):
+    """Матрица пользователь x рецепт из избранного и корзины."""
+    users, recipes, weights = [], [], []
+    for model, weight in ((Favorite, 1), (ShoppingCart, SHOPPING_CART_WEIGHT)):
+        user_ids, ids = fetch_pairs(model.objects, ('user_id', 'recipe_id'))
+        users.append(user_ids)
+        recipes.append(np.searchsorted(recipe_ids, ids))
+        weights.append(np.full(len(ids), weight, dtype=np.float32))
+    _, users = np.unique(np.concatenate(users), return_inverse=True)
+    return sparse.csr_matrix(
+        (np.concatenate(weights), (users, np.concatenate(recipes))),
+        shape=(users.max(initial=-1) + 1, len(recipe_ids))
+    )
+
+
+def feature_matrix(model, field, recipe_ids, max_recipes=None):
+    """Матрица признак x рецепт для ингредиентов или тегов.
+
+    Веса - IDF: чем реже признак, тем больше он говорит о сходстве.
+    Признаки, которые есть больше чем в max_recipes рецептах (соль,
+    вода), пропускаются: сходство по ним почти ничего не значит,
+    а пар рецептов с ними больше всего.
+    """
+    recipes, values = fetch_pairs(model.objects, ('recipe_id', field))
+    _, values = np.unique(values, return_inverse=True)
+    counts = np.bincount(values)
+    keep = np.ones(len(values), dtype=bool)
+    if max_recipes is not None:
+        keep = counts[values] <= max_recipes
+    idf = np.log(len(recipe_ids) / counts).astype(np.float32) + 1
+    return sparse.csr_matrix(
+        (idf[values[keep]],
+         (values[keep], np.searchsorted(recipe_ids, recipes[keep]))),
+        shape=(len(counts), len(recipe_ids))
+    )
+
+
+def top_similar(similarity, block, top):
+    """Лучшие top оценок в каждом столбце блока, без самого рецепта.
+
+    similarity - матрица сходства блока в формате CSC. Возвращает
+    массивы (рецепт, похожий рецепт, оценка) в индексах рецептов.
+    """
+    recipes, similar, scores = [], [], []
+    for column, recipe in enumerate(block):
+        start, end = similarity.indptr[column:column + 2]
+        rows = similarity.indices[start:end]
+        data = similarity.data[start:end]
+        keep = (rows != recipe) & (data > 0)
+        rows, data = rows[keep], data[keep]
+        if len(data) > top:
+            best = np.argpartition(-data, top)[:top]
+            rows, data = rows[best], data[best]
+        order = np.argsort(-data, kind='stable')
+        recipes.append(np.full(len(order), recipe))
+        similar.append(rows[order])
+        scores.append(data[order])
+    return (
+        np.concatenate(recipes), np.concatenate(similar),
+        np.concatenate(scores)
+    )
+
+
+def build(top, weights, block_size, max_ingredient_recipes):
+    """Похожие рецепты: массивы (id рецепта, id похожего, оценка).
+
+    Оценка - сумма с весами weights трёх косинусных мер: по
+    пользователям, добавившим оба рецепта в избранное или корзину,
+    по ингредиентам и по тегам. Кандидатами служат рецепты со
+    сходством по пользователям или ингредиентам, теги только
+    уточняют оценку: общий тег есть у слишком многих пар.
+    """
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('id').values_list('id', flat=True).iterator(),
+        dtype=np.int64
+    )
+    users_weight, ingredients_weight, tags_weight = weights
+    users = normalize_columns(interaction_matrix(recipe_ids))
+    ingredients = normalize_columns(feature_matrix(
+        IngredientRecipe, 'ingredient_id', recipe_ids, max_ingredient_recipes
+    ))
+    tags = normalize_columns(
+        feature_matrix(TagRecipe, 'tag_id', recipe_ids)
+    ).tocsc()
+    users_t, ingredients_t = users.T.tocsr(), ingredients.T.tocsr()
+    users, ingredients = users.tocsc(), ingredients.tocsc()
+    result = []
+    for start in range(0, len(recipe_ids), block_size):
+        block = np.arange(start, min(start + block_size, len(recipe_ids)))
+        similarity = (
+            users_weight * (users_t @ users[:, block])
+            + ingredients_weight * (ingredients_t @ ingredients[:, block])
+        ).tocsc()
+        # Сходство по тегам для каждой ненулевой пары (строка, столбец).
+        columns = np.repeat(block, np.diff(similarity.indptr))
+        shared_tags = tags[:, similarity.indices].multiply(
+            tags[:, columns]
+        ).sum(axis=0)
+        similarity.data += tags_weight * np.asarray(shared_tags).ravel()
+        result.append(top_similar(similarity, block, top))
+    if not result:
+        return recipe_ids, recipe_ids, np.empty(0, dtype=np.float32)
+    recipes, similar, scores = (np.concatenate(part) for part in zip(*result))
+    return recipe_ids[recipes], recipe_ids[similar], scores
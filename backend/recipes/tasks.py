@@ -0,0 +1,8 @@
+from jobs.runner import task
+from .popularity import update_popularity
+
+
+@task('recipes.popularity')
+def recalculate_popularity(job):
+    """Пересчитывает популярность рецептов, запускается по расписанию."""
+    return {'recipes': update_popularity()}
@@ -0,0 +1,82 @@
+import hmac
+import random
+from hashlib import sha256
+from string import ascii_letters, digits
+
+from django.conf import settings
+
+ALPHABET = digits + ascii_letters
+SHORT_LINK_LENGTH = 5
+# Число различных коротких ссылок длины SHORT_LINK_LENGTH.
+SHORT_LINK_SPACE = len(ALPHABET) ** SHORT_LINK_LENGTH
+HALF_BITS = (SHORT_LINK_SPACE.bit_length() + 1) // 2
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+
+
+def fields_except(instance, excluded):
+    """Поля объекта для save(update_fields=...) без полей excluded.
+
+    Счётчики меняются только запросами UPDATE с F(), а обычное
+    сохранение записало бы в них значения, прочитанные вместе
+    с объектом, и потеряло бы чужие изменения. Отложенные поля
+    (defer, only) пропускаются, как в обычном save().
+    """
+    excluded = {*excluded, *instance.get_deferred_fields()}
+    return [
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.attname not in excluded
+        and field.name not in excluded
+    ]
+
+
+def _round(value, index):
+    digest = hmac.new(
+        settings.SHORT_LINK_KEY.encode(), f'{index}:{value}'.encode(), sha256
+    ).digest()
+    return int.from_bytes(digest[:4], 'big') & HALF_MASK
+
+
+def _feistel(value, rounds):
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for index in rounds:
+        left, right = right, left ^ _round(right, index)
+    return (right << HALF_BITS) | left
+
+
+def _permute(value, rounds):
+    """Перестановка чисел [0, SHORT_LINK_SPACE) сетью Фейстеля.
+
+    Сеть переставляет числа из 2 * HALF_BITS бит, а значения вне
+    диапазона снова пропускаются через неё (cycle walking), пока
+    не попадут в диапазон.
+    """
+    value = _feistel(value, rounds)
+    while value >= SHORT_LINK_SPACE:
+        value = _feistel(value, rounds)
+    return value
+
+
+def get_short_link(recipe_id):
+    """Короткая ссылка рецепта - закодированная в base62 перестановка id.
+
+    Перестановка взаимно однозначна, поэтому ссылки разных рецептов
+    не совпадают, а соседние id дают непохожие ссылки. Занятой она
+    может быть только случайной ссылкой, выданной до миграции 0005
+    (см. Recipe.save).
+    """
+    if not 0 <= recipe_id < SHORT_LINK_SPACE:
+        raise ValueError(
+            f'Нельзя построить короткую ссылку для id={recipe_id}.'
+        )
+    value = _permute(recipe_id, range(ROUNDS))
+    chars = []
+    for _ in range(SHORT_LINK_LENGTH):
+        value, remainder = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
+
+def get_random_short_link():
+    """Случайная ссылка - так выдавались ссылки до миграции 0005."""
+    return ''.join(random.choices(ALPHABET, k=SHORT_LINK_LENGTH))
@@ -7,7 +7,10 @@ from .models import CustomGroup, Subscription, User
 
 @admin.register(User)
 class UserAdmin(UserAdmin):
-    list_display = ('username', 'email', 'first_name', 'last_name')
+    list_display = (
+        'username', 'email', 'first_name', 'last_name',
+        'recipes_count', 'subscribers_count'
+    )
     search_fields = ('username', 'email', 'first_name', 'last_name')
 
 
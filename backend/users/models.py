@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractUser, Group
 from django.db import models
 
+from recipes.images import AVATAR_VARIANTS, sync_variants
+from recipes.utils import fields_except
 from .validators import REGEX_USERNAME, validate_username
 
 
@@ -20,13 +22,44 @@ class User(AbstractUser):
         upload_to='images/avatar/',
         blank=True
     )
+    avatar_variants = models.JSONField(
+        'Варианты аватара',
+        default=dict,
+        blank=True,
+        editable=False
+    )
+    recipes_count = models.IntegerField(
+        'Число рецептов',
+        default=0,
+        editable=False
+    )
+    subscribers_count = models.IntegerField(
+        'Число подписчиков',
+        default=0,
+        editable=False
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
+    # Меняются только через F(), сохранение объекта их не записывает.
+    COUNTER_FIELDS = {'recipes_count', 'subscribers_count'}
 
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = fields_except(
+                self, self.COUNTER_FIELDS
+            )
+        if sync_variants(
+            self, 'avatar', 'avatar_variants', AVATAR_VARIANTS
+        ) and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {
+                *kwargs['update_fields'], 'avatar_variants'
+            }
+        super().save(*args, **kwargs)
+
 
 class Subscription(models.Model):
     """Модель подписки."""
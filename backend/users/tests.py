@@ -0,0 +1,92 @@
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.management.commands.benchmark_api import IMAGE
+from recipes.models import Favorite, Recipe
+from .models import Subscription, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com',
+        first_name=username, last_name=username, password='password'
+    )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CounterSaveTests(TestCase):
+    """Сохранение объекта не затирает счётчики, изменённые через F()."""
+
+    def test_avatar_keeps_subscribers_count(self):
+        author = create_user('author')
+        follower = create_user('follower')
+        # Пользователь запроса загружен до подписки на него.
+        stale = User.objects.get(pk=author.pk)
+        Subscription.objects.create(user=follower, subscribed_to=author)
+        client = APIClient()
+        client.force_authenticate(stale)
+
+        response = client.put(
+            '/api/users/me/avatar/', {'avatar': IMAGE}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        response = client.delete('/api/users/me/avatar/')
+        self.assertEqual(response.status_code, 204)
+
+        author.refresh_from_db()
+        self.assertEqual(author.subscribers_count, 1)
+
+    def test_recipe_save_keeps_favorites_count(self):
+        author = create_user('author')
+        recipe = Recipe.objects.create(
+            author=author, name='Борщ', text='Сварить.', cooking_time=60
+        )
+        stale = Recipe.objects.get(pk=recipe.pk)
+        Favorite.objects.create(user=author, recipe=recipe)
+
+        stale.name = 'Щи'
+        stale.save()
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Щи')
+        self.assertEqual(recipe.favorites_count, 1)
+        author.refresh_from_db()
+        self.assertEqual(author.recipes_count, 1)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ImageVariantTests(TestCase):
+    """Варианты создаются только для загруженных файлов."""
+
+    def test_login_with_missing_avatar_file(self):
+        user = create_user('legacy')
+        User.objects.filter(pk=user.pk).update(
+            avatar='images/avatar/missing.png'
+        )
+
+        response = APIClient().post(
+            '/api/auth/token/login/',
+            {'email': user.email, 'password': 'password'}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertEqual(user.avatar_variants, {})
+
+    def test_corrupt_upload_saves_without_variants(self):
+        user = create_user('corrupt')
+        user.avatar.save('broken.png', ContentFile(b'not an image'))
+
+        user.refresh_from_db()
+        self.assertEqual(user.avatar.name, 'images/avatar/broken.png')
+        self.assertEqual(user.avatar_variants, {})